@@ -0,0 +1,179 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+import logging
+from os import PathLike
+from pathlib import Path
+import tempfile
+import time
+import traceback
+from typing import Callable, Iterable, List, Optional, Union
+
+import OpenScore
+
+_logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchResult:
+    demo_path: Path
+    demo: Optional["OpenScore.Demo"] = None
+    error: Optional[str] = None
+    wall_time: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BatchReport:
+    results: List[BatchResult] = field(default_factory=list)
+    wall_time: float = 0.0
+
+    @property
+    def failed(self) -> List[BatchResult]:
+        return [result for result in self.results if not result.ok]
+
+    @property
+    def demos_per_minute(self) -> float:
+        return 60 * len(self.results) / self.wall_time if self.wall_time else 0.0
+
+
+def _job_kwargs(demo_kwargs: dict, demo_path: Path) -> dict:
+    """
+    :return: The Demo keyword arguments for one job, with its own cProfile dump (e.g. batch-<demo>.prof for
+        batch.prof) so that the jobs don't overwrite each other's
+    """
+    cprofile_path = demo_kwargs.get("cprofile_path")
+    if cprofile_path is None:
+        return demo_kwargs
+    cprofile_path = Path(cprofile_path)
+    return {**demo_kwargs,
+            "cprofile_path": cprofile_path.with_name(f"{cprofile_path.stem}-{demo_path.stem}{cprofile_path.suffix}")}
+
+
+def _process_one(demo_path: Path, demo_type: str, config_path: Union[str, PathLike], tee_output: bool,
+                 demo_kwargs: dict) -> BatchResult:
+    """
+    Process a single demo in a worker process, capturing any failure instead of raising it
+    """
+    result = BatchResult(demo_path)
+    start = time.perf_counter()
+    job_kwargs = _job_kwargs(demo_kwargs, demo_path)
+    try:
+        output_path = None
+        if tee_output:
+            # Give every job its own output file so that concurrent runs can't overwrite each other
+            tmp_dir = Path(OpenScore.Demo.load_config(config_path)["tmp_dir"])
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+            fd, output_path = tempfile.mkstemp(suffix=".txt", prefix=f"{demo_path.stem}-", dir=tmp_dir)
+            open(fd).close()
+
+        result.demo = OpenScore.Demo(demo_path, demo_type, config_path, tee_output=tee_output, output_path=output_path,
+                                     **job_kwargs)
+    except Exception:
+        result.error = traceback.format_exc()
+    result.wall_time = time.perf_counter() - start
+    return result
+
+
+def _finish_result(result: BatchResult, on_result: Optional[Callable[[BatchResult], None]], keep_demos: bool):
+    """
+    Hand a finished result to the caller's callback, then drop its Demo unless it is kept in the report
+    """
+    if on_result is not None:
+        on_result(result)
+    if not keep_demos:
+        result.demo = None
+
+
+def process_many(demo_paths: Iterable[Union[str, PathLike]], demo_type: str, config_path: Union[str, PathLike],
+                 workers: int = None, tee_output: bool = False, on_result: Callable[[BatchResult], None] = None,
+                 keep_demos: bool = True, **demo_kwargs) -> BatchReport:
+    """
+    Process many demos in parallel, one demoinfogo process and parser per worker
+    :param demo_paths: The CS:GO .dem files to process
+    :param demo_type: The matchmaking service the demos are from
+    :param config_path: The path to the config YAML or JSON file, or None to only use environment variables
+    :param workers: The amount of worker processes. Defaults to the amount of CPUs
+    :param tee_output: Also write each demo's demoinfogo output to its own file in the tmp_dir
+    :param on_result: Called in this process with each result as soon as its demo is done, in completion order
+        (e.g. to export the demo)
+    :param keep_demos: Keep every Demo in the report. Pass False with on_result so that each Demo can be freed once
+        on_result returns, instead of holding every processed match in memory until the batch is done
+    :param demo_kwargs: Extra keyword arguments for every Demo (e.g. use_cache=True).
+        A cprofile_path gets the demo's name appended
+    :return: The result of every demo, in the order they were given, and the overall wall time
+    """
+    demo_paths = [OpenScore.str_to_path(path) for path in demo_paths]
+    results = [None] * len(demo_paths)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_process_one, path, demo_type, config_path, tee_output, demo_kwargs): index
+            for index, path in enumerate(demo_paths)
+        }
+        for future in as_completed(futures):
+            # Drop the future as well, since it holds on to the result
+            index = futures.pop(future)
+            try:
+                result = future.result()
+            except Exception:  # The worker itself died (e.g. BrokenProcessPool)
+                result = BatchResult(demo_paths[index], error=traceback.format_exc())
+
+            if result.ok:
+                _logger.info(f"Processed {result.demo_path} in {result.wall_time:.2f}s")
+            else:
+                _logger.error(f"Failed to process {result.demo_path}:\n{result.error}")
+            _finish_result(result, on_result, keep_demos)
+            results[index] = result
+
+    report = BatchReport(results, time.perf_counter() - start)
+    _logger.info(f"Processed {len(results) - len(report.failed)}/{len(results)} demos in {report.wall_time:.2f}s "
+                 f"({report.demos_per_minute:.1f} demos/min)")
+    return report
+
+
+async def process_many_async(demo_paths: Iterable[Union[str, PathLike]], demo_type: str,
+                             config_path: Union[str, PathLike], concurrency: int = 8,
+                             on_result: Callable[[BatchResult], None] = None, keep_demos: bool = True,
+                             **demo_kwargs) -> BatchReport:
+    """
+    Process many demos on the running event loop, with at most `concurrency` demoinfogo processes at once
+    :param demo_paths: The CS:GO .dem files to process
+    :param demo_type: The matchmaking service the demos are from
+    :param config_path: The path to the config YAML or JSON file, or None to only use environment variables
+    :param concurrency: The most demoinfogo processes to run at once
+    :param on_result: Called with each result as soon as its demo is done, in completion order
+    :param keep_demos: Keep every Demo in the report. Pass False with on_result so that each Demo can be freed once
+        on_result returns
+    :param demo_kwargs: Extra keyword arguments for every Demo.from_demo_async call.
+        A cprofile_path gets the demo's name appended
+    :return: The result of every demo, in the order they were given, and the overall wall time
+    """
+    demo_paths = [OpenScore.str_to_path(path) for path in demo_paths]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process_one(demo_path: Path) -> BatchResult:
+        result = BatchResult(demo_path)
+        start = time.perf_counter()
+        job_kwargs = _job_kwargs(demo_kwargs, demo_path)
+        try:
+            result.demo = await OpenScore.Demo.from_demo_async(demo_path, demo_type, config_path, semaphore=semaphore,
+                                                               **job_kwargs)
+            _logger.info(f"Processed {demo_path} in {time.perf_counter() - start:.2f}s")
+        except Exception:
+            result.error = traceback.format_exc()
+            _logger.error(f"Failed to process {demo_path}:\n{result.error}")
+        result.wall_time = time.perf_counter() - start
+        _finish_result(result, on_result, keep_demos)
+        return result
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(process_one(path) for path in demo_paths))
+    report = BatchReport(list(results), time.perf_counter() - start)
+    _logger.info(f"Processed {len(results) - len(report.failed)}/{len(results)} demos in {report.wall_time:.2f}s "
+                 f"({report.demos_per_minute:.1f} demos/min)")
+    return report
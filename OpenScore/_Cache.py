@@ -0,0 +1,116 @@
+import hashlib
+import logging
+import os
+from os import PathLike
+from pathlib import Path
+import pickle
+import tempfile
+from typing import Any, Optional, Union
+
+import OpenScore._Parser as Parser
+
+_logger = logging.getLogger(__name__)
+
+# Bump whenever the pickled GameState layout changes so that stale entries are never loaded
+FORMAT_VERSION = 9
+
+_DEFAULT_MAX_MB = 1024
+
+
+class DemoCache:
+    """
+    Persistent cache of finished GameStates, keyed by the demo file's contents, the demo type and the parser version.
+    The least recently used entries are evicted once the cache grows beyond max_bytes.
+    """
+
+    def __init__(self, cache_dir: Union[str, PathLike], max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "DemoCache":
+        """
+        Create the cache described by an OpenScore config.
+        Uses the "cache_dir" and "cache_max_mb" keys, defaulting to <tmp_dir>/cache and 1024 MB
+        """
+        cache_dir = config.get("cache_dir") or Path(config["tmp_dir"]) / Path("cache")
+        max_mb = config.get("cache_max_mb", _DEFAULT_MAX_MB)
+        return cls(cache_dir, int(max_mb * 1024 * 1024))
+
+    @staticmethod
+    def key(demo_path: Union[str, PathLike], demo_type: str, variant: str = "") -> str:
+        """
+        :param demo_path: The CS:GO .dem file
+        :param demo_type: The matchmaking service the demo is from
+        :param variant: Distinguishes gamestates of the same demo built with different options
+        :return: The cache key for the demo
+        """
+        digest = hashlib.sha256()
+        with open(demo_path, "rb") as demo_file:
+            for chunk in iter(lambda: demo_file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        key = f"{digest.hexdigest()}-{demo_type}-p{Parser.VERSION}-f{FORMAT_VERSION}"
+        return f"{key}-{variant}" if variant else key
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / Path(f"{key}.pickle")
+
+    def load(self, key: str) -> Optional[Any]:
+        """
+        :param key: The cache key from DemoCache.key
+        :return: The cached GameState, or None on a miss
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "rb") as entry_file:
+                gamestate = pickle.load(entry_file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            _logger.warning(f"Discarding unreadable cache entry {entry_path}: {e}")
+            entry_path.unlink(missing_ok=True)
+            return None
+
+        # Mark the entry as recently used
+        os.utime(entry_path)
+        _logger.info(f"Loaded gamestate from cache entry {entry_path}")
+        return gamestate
+
+    def store(self, key: str, gamestate: Any):
+        """
+        Store a GameState, then evict old entries if the cache is too large
+        :param key: The cache key from DemoCache.key
+        :param gamestate: The GameState to store
+        """
+        # Write to a temporary file first so that concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+        try:
+            with open(fd, "wb") as tmp_file:
+                pickle.dump(gamestate, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._entry_path(key))
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+        self._evict()
+
+    def _evict(self):
+        """
+        Delete the least recently used entries until the cache fits in max_bytes
+        """
+        entries = []
+        for entry_path in self.cache_dir.glob("*.pickle"):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:  # Evicted by a concurrent process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            _logger.info(f"Evicting cache entry {entry_path}")
+            entry_path.unlink(missing_ok=True)
+            total_size -= size
@@ -0,0 +1,65 @@
+import json
+import os
+from os import PathLike
+from typing import Dict, Optional, Tuple, Union
+
+# OPENSCORE_<KEY> environment variables (e.g. OPENSCORE_TMP_DIR) override the config file's values
+ENV_PREFIX = "OPENSCORE_"
+
+# Config keys with numeric values. Every other key (paths included) is kept as the environment variable's string
+_NUMERIC_KEYS = ("cache_max_mb",)
+
+# Parsed config files by absolute path, with the modification time and size they were parsed at
+_loaded: Dict[str, Tuple[int, int, dict]] = {}
+
+
+def load_config(config_path: Optional[Union[str, PathLike]]) -> dict:
+    """
+    Load an OpenScore config. Files ending in .json are read with the json module, anything else as YAML
+    (PyYAML is only imported then). Each file is parsed once per process, and again only after it changes.
+    OPENSCORE_<KEY> environment variables override the file's values. They are strings, except for numeric keys
+    (OPENSCORE_CACHE_MAX_MB=512 is the number 512)
+    :param config_path: The path to the config YAML or JSON file, or None to only use environment variables
+    :return: The config, as a new dict
+    """
+    config = {} if config_path is None else dict(_load_file(os.path.abspath(config_path)))
+    config.update(_environment_config())
+    return config
+
+
+def _load_file(path: str) -> dict:
+    stat = os.stat(path)
+    loaded = _loaded.get(path)
+    if loaded is not None and loaded[:2] == (stat.st_mtime_ns, stat.st_size):
+        return loaded[2]
+
+    with open(path) as config_file:
+        if path.endswith(".json"):
+            config = json.load(config_file)
+        else:
+            import yaml
+            config = yaml.safe_load(config_file)
+    config = config or {}
+    _loaded[path] = (stat.st_mtime_ns, stat.st_size, config)
+    return config
+
+
+def _environment_config() -> dict:
+    config = {}
+    for name, value in os.environ.items():
+        if name.startswith(ENV_PREFIX):
+            key = name[len(ENV_PREFIX):].lower()
+            if key in _NUMERIC_KEYS:
+                value = _parse_number(name, value)
+            config[key] = value
+    return config
+
+
+def _parse_number(name: str, value: str) -> Union[int, float]:
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            raise ValueError(f"{name} must be a number, not {value!r}") from None
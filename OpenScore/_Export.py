@@ -0,0 +1,254 @@
+from array import array
+import json
+import mmap
+from os import PathLike
+from pathlib import Path
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+# Bump whenever the layout of the exported tables changes
+FORMAT_VERSION = 2
+
+_MANIFEST_NAME = "manifest.json"
+
+# array typecode -> the equivalent NumPy dtype (without byte order), for readers which use numpy.memmap
+_dtypes = {"b": "i1", "i": "i4", "q": "i8", "Q": "u8", "d": "f8"}
+
+# table -> column -> array typecode. Columns with typecode "i" in _categorical are dictionary-encoded strings
+_schema = {
+    "rounds": {"round": "i", "start_tick": "q", "end_tick": "q", "end_reason": "i", "winner": "i", "overtime": "b"},
+    "players": {"round": "i", "steamid": "Q", "footsteps": "i"},
+    "shots": {"round": "i", "tick": "q", "steamid": "Q", "weapon": "i", "silenced": "b"},
+    "hits": {"round": "i", "tick": "q", "steamid": "Q", "attacker_steamid": "Q", "weapon": "i", "health": "i",
+             "armor": "i", "dmg_health": "i", "dmg_armor": "i", "hitgroup": "i"},
+    "deaths": {"round": "i", "tick": "q", "steamid": "Q", "attacker_steamid": "Q", "assister_steamid": "Q",
+               "weapon": "i", "assistedflash": "b", "headshot": "b", "penetrated": "i"},
+    "positions": {"round": "i", "tick": "q", "steamid": "Q", "x": "d", "y": "d", "z": "d", "pitch": "d", "yaw": "d"},
+    "bomb": {"round": "i", "tick": "q", "steamid": "Q", "event": "i", "end_tick": "q", "success": "b", "haskit": "b"}
+}
+_categorical = {("shots", "weapon"), ("hits", "weapon"), ("deaths", "weapon"), ("bomb", "event")}
+
+
+def _steamid(steamid64: Optional[str]) -> int:
+    """
+    :return: The steamid64 as an integer, or 0 if it is unknown
+    """
+    return int(steamid64) if steamid64 and steamid64.isdigit() else 0
+
+
+def _user_steamid(user: Any) -> int:
+    """
+    :return: The steamid64 of a userid/attacker/assister value, or 0 if it is unknown
+    """
+    return _steamid(user.get("steamid64")) if isinstance(user, dict) else 0
+
+
+def _number(value: Any, default: int = -1) -> Any:
+    """
+    :return: The value, or default for the "" that the parser produces for empty values (and None)
+    """
+    return default if value is None or value == "" else value
+
+
+class _TableWriter:
+    """
+    Columns of one table. Rows are collected as tuples in _schema order and moved into the columns by finish()
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.columns = {column: array(typecode) for column, typecode in _schema[name].items()}
+        self.categories: Dict[str, Dict[str, int]] = {
+            column: {} for column in self.columns if (name, column) in _categorical
+        }
+        self.rows: List[tuple] = []
+
+    def finish(self):
+        if not self.rows:
+            return
+        for (column, values), column_values in zip(self.columns.items(), zip(*self.rows)):
+            categories = self.categories.get(column)
+            if categories is not None:
+                column_values = [categories.setdefault(value, len(categories)) for value in column_values]
+            values.extend(column_values)
+        self.rows = []
+
+
+def _build_tables(gamestate: Any, names: Iterable[str] = None,
+                  round_indexes: Iterable[int] = None) -> Dict[str, _TableWriter]:
+    """
+    Flatten a gamestate into columns, in one pass over its rounds
+    :param gamestate: The GameState to flatten
+    :param names: If given, only build these tables
+    :param round_indexes: If given, only flatten these rounds (keeping their indexes in gamestate.rounds)
+    :return: A dict of table name -> filled _TableWriter
+    """
+    tables = {name: _TableWriter(name) for name in (_schema if names is None else names)}
+    rounds, players, shots, hits, deaths, positions, bomb = (
+        tables[name].rows if name in tables else None
+        for name in ("rounds", "players", "shots", "hits", "deaths", "positions", "bomb"))
+
+    if round_indexes is None:
+        round_indexes = range(len(gamestate.rounds))
+    for round_index in round_indexes:
+        game_round = gamestate.rounds[round_index]
+        if rounds is not None:
+            rounds.append((round_index, game_round.start_tick, _number(game_round.end_tick),
+                           _number(game_round.end_reason), _number(game_round.winner), game_round.overtime))
+
+        for player in game_round.players.values():
+            steamid = _steamid(player.steamid64)
+
+            if players is not None:
+                players.append((round_index, steamid, player.footsteps))
+
+            if shots is not None:
+                shots.extend((round_index, shot.tick, steamid, shot.weapon, shot.silenced) for shot in player.shots)
+            # Hits and deaths are shared by several players; take each from the victim only
+            if hits is not None:
+                hits.extend((round_index, hit.tick, steamid, _user_steamid(hit.attacker), hit.weapon,
+                             _number(hit.health), _number(hit.armor), _number(hit.dmg_health), _number(hit.dmg_armor),
+                             _number(hit.hitgroup))
+                            for hit in player.hits_taken)
+            if deaths is not None:
+                deaths.extend((round_index, death.tick, steamid, _user_steamid(death.attacker),
+                               _user_steamid(death.assister), death.weapon, death.assistedflash, death.headshot,
+                               _number(death.penetrated, 0))
+                              for death in player.deaths)
+
+            if positions is not None:
+                history = player.orientation_history
+                columns = tables["positions"].columns
+                columns["round"].extend(array("i", [round_index]) * len(history))
+                columns["steamid"].extend(array("Q", [steamid]) * len(history))
+                for column in ("tick", "x", "y", "z", "pitch", "yaw"):
+                    columns[column].extend(getattr(history, column))
+
+            if bomb is not None:
+                # round, tick, steamid, event, end_tick, success, haskit
+                bomb.extend((round_index, _number(carry_start), steamid, "carry", _number(carry_end), -1, -1)
+                            for carry_start, carry_end in player.bomb_carry_intervals)
+                if player.bomb_planted_tick is not None:
+                    bomb.append((round_index, player.bomb_planted_tick, steamid, "plant", -1, -1, -1))
+                bomb.extend((round_index, defusal.tick, steamid, "defuse", _number(defusal.defuse_tick),
+                             defusal.success, defusal.haskit)
+                            for defusal in player.bomb_defusal_attempts)
+
+    for table in tables.values():
+        table.finish()
+    return tables
+
+
+def export_columns(gamestate: Any, out_dir: Union[str, PathLike]) -> Path:
+    """
+    Write a gamestate's rounds, players, shots, hits, deaths, positions and bomb events as columnar tables,
+    in one pass. Every column is a raw native-endian file (<table>.<column>.bin) described by manifest.json,
+    so it can be memory-mapped by load_columns (or numpy.memmap) without building any Python objects
+    :param gamestate: The GameState to export
+    :param out_dir: The directory to write to. It is created if needed
+    :return: The path of the manifest
+    :raises ValueError: If rounds have been released (retain="aggregates")
+    """
+    gamestate.require_records("export_columns")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tables = _build_tables(gamestate)
+
+    manifest = {"format_version": FORMAT_VERSION, "byteorder": sys.byteorder, "tables": {}}
+    for name, table in tables.items():
+        table_manifest = manifest["tables"][name] = {"rows": len(table.columns["round"]), "columns": {}}
+        for column, values in table.columns.items():
+            file_name = f"{name}.{column}.bin"
+            with open(out_dir / Path(file_name), "wb") as column_file:
+                values.tofile(column_file)
+            column_manifest = table_manifest["columns"][column] = {
+                "file": file_name,
+                "typecode": values.typecode,
+                "dtype": ("<" if sys.byteorder == "little" else ">") + _dtypes[values.typecode]
+            }
+            if column in table.categories:
+                column_manifest["categories"] = list(table.categories[column])
+
+    manifest_path = out_dir / Path(_MANIFEST_NAME)
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+    return manifest_path
+
+
+class ColumnStore:
+    """
+    Tables exported by export_columns. Columns are memory-mapped on first access and returned as memoryviews,
+    so nothing is read or copied until it is used.
+    store["shots"]["tick"][i] is the tick of the i-th shot; categorical columns hold indexes into categories()
+    """
+
+    def __init__(self, out_dir: Union[str, PathLike]):
+        self.path = Path(out_dir)
+        with open(self.path / Path(_MANIFEST_NAME)) as manifest_file:
+            self.manifest = json.load(manifest_file)
+        if self.manifest["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported export format version {self.manifest['format_version']}")
+        self._columns: Dict[str, Dict[str, memoryview]] = {}
+
+    @property
+    def tables(self) -> List[str]:
+        return list(self.manifest["tables"])
+
+    def rows(self, table: str) -> int:
+        return self.manifest["tables"][table]["rows"]
+
+    def categories(self, table: str, column: str) -> List[str]:
+        return self.manifest["tables"][table]["columns"][column]["categories"]
+
+    def column(self, table: str, column: str) -> memoryview:
+        table_columns = self._columns.setdefault(table, {})
+        if column not in table_columns:
+            table_columns[column] = self._map_column(self.manifest["tables"][table]["columns"][column])
+        return table_columns[column]
+
+    def _map_column(self, column_manifest: dict) -> memoryview:
+        column_path = self.path / Path(column_manifest["file"])
+        typecode = column_manifest["typecode"]
+
+        if self.manifest["byteorder"] != sys.byteorder:
+            # Can't map foreign-endian data directly; fall back to a swapped copy
+            values = array(typecode)
+            with open(column_path, "rb") as column_file:
+                values.frombytes(column_file.read())
+            values.byteswap()
+            return memoryview(values)
+
+        with open(column_path, "rb") as column_file:
+            if column_path.stat().st_size == 0:  # mmap can't map empty files
+                return memoryview(array(typecode))
+            mapped = mmap.mmap(column_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped).cast(typecode)
+
+    def __getitem__(self, table: str) -> "_LazyTable":
+        if table not in self.manifest["tables"]:
+            raise KeyError(table)
+        return _LazyTable(self, table)
+
+
+class _LazyTable:
+    def __init__(self, store: ColumnStore, table: str):
+        self._store = store
+        self._table = table
+
+    def __getitem__(self, column: str) -> memoryview:
+        return self._store.column(self._table, column)
+
+    def __len__(self):
+        return self._store.rows(self._table)
+
+    def keys(self) -> List[str]:
+        return list(self._store.manifest["tables"][self._table]["columns"])
+
+
+def load_columns(out_dir: Union[str, PathLike]) -> ColumnStore:
+    """
+    Open tables written by export_columns without reading them
+    :param out_dir: The directory that was exported to
+    :return: The lazily memory-mapped tables
+    """
+    return ColumnStore(out_dir)
@@ -0,0 +1,35 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, List
+
+
+class TickIndex:
+    """
+    Records kept sorted by tick, for logarithmic lookups of tick ranges
+    """
+    __slots__ = ("ticks", "records")
+
+    def __init__(self):
+        self.ticks = array("q")
+        self.records: List[Any] = []
+
+    def add(self, tick: int, record: Any):
+        """
+        Add a record. Appending in tick order is O(1); out of order records are inserted in place
+        """
+        if not self.ticks or tick >= self.ticks[-1]:
+            self.ticks.append(tick)
+            self.records.append(record)
+        else:
+            index = bisect_right(self.ticks, tick)
+            self.ticks.insert(index, tick)
+            self.records.insert(index, record)
+
+    def between(self, start_tick: int, end_tick: int) -> List[Any]:
+        """
+        :return: Every record from start_tick to end_tick, inclusive, in tick order
+        """
+        return self.records[bisect_left(self.ticks, start_tick):bisect_right(self.ticks, end_tick)]
+
+    def __len__(self):
+        return len(self.ticks)
@@ -1,59 +1,405 @@
+import locale
 import logging
+import mmap
+import os
 from os import PathLike
-from typing import Dict, Union, Tuple
+import re
+from sys import intern
+from typing import AbstractSet, Any, Callable, Dict, Union, Iterable, Iterator, List, Tuple
 
 _logger = logging.getLogger(__name__)
 
+# Bump whenever the parsed output changes so that cached results are rebuilt
+VERSION = 2
 
-def parse(event_file_path: Union[str, PathLike]) -> Dict:
+# Lines which are demoinfogo commentary rather than part of an event
+_comment_prefixes = ("Cannot", "userid")
+_comment_suffixes = ("Disconnect", "disconnected")
+
+
+def parse(events: Union[str, PathLike, Iterable[str]], event_types: AbstractSet[str] = None) -> Iterator[Dict]:
+    """
+    Parser for demoinfogo output. Keys indented further than the previous key are nested under it, to any depth
+    :param events: The path to a demoinfogo output file, or any iterable of its lines (e.g. a subprocess pipe)
+    :param event_types: If given, only these event types are parsed and yielded.
+        The bodies of all other events are skipped without being tokenized
+    :yield: The next event from the demoinfogo output
+    """
+    if isinstance(events, (str, PathLike)):
+        with open(events) as event_file:
+            yield from EventParser(event_types).feed(event_file)
+    else:
+        yield from EventParser(event_types).feed(events)
+
+
+def parse_parallel(path: Union[str, PathLike], event_types: AbstractSet[str] = None,
+                   workers: int = None) -> Iterator[Dict]:
     """
-    Very rudimentary parser for demoinfogo output. Only supports 2 indentation levels
-    :param event_file_path: The path to the demoinfogo output file
+    Parser for demoinfogo output files, parsing shards of the file in worker processes
+    (see EventParser.feed_parallel). Yields the same events as parse, in the same order
+    :param path: The path to a demoinfogo output file
+    :param event_types: If given, only these event types are parsed and yielded
+    :param workers: The amount of worker processes. Defaults to the amount of CPUs
     :yield: The next event from the demoinfogo output
     """
-    current_event = {}
-    last_indent = 1
-    building_event = False
-    last_line = None
-    with open(event_file_path) as event_file:
-        for line_number, line in enumerate(event_file):
-            line = line.rstrip()
-
-            if any([line.startswith(s) for s in ["Cannot", "userid"]]) or \
-                    any([line.endswith(s) for s in ["Disconnect", "disconnected"]]):
-                _logger.info(f"Skipping comment line {line_number}: {line}")
-            elif not building_event:
-                current_event["event_type"] = line
-                current_event["line_number"] = line_number
-                building_event = True
-            elif line == "{":
-                pass
-            elif line == "}":
-                yield current_event
-                building_event = False
-                current_event = {}
-            else:
-                indent_amount, key, data = _parse_line(line, last_line)
-
-                if indent_amount != last_indent:
-                    parent_key = last_key
+    yield from EventParser(event_types).feed_parallel(path, workers)
+
+
+# The amount of bytes feed_parallel decodes at once
+_chunk_size = 256 * 1024
+
+_lone_carriage_return = re.compile(rb"\r(?!\n)")
+
+
+def _line_end(mapped: mmap.mmap, position: int) -> int:
+    """
+    :return: The position after the end of the line containing position
+    """
+    return mapped.find(b"\n", position) + 1 or len(mapped)
+
+
+def _event_end(mapped: mmap.mmap, line_start: int, skipping: bool, encoding: str) -> Tuple[int, bool]:
+    """
+    Find the line which closes an event the same way EventParser.feed does:
+    an event which is being parsed ends at a line which is exactly "}",
+    and an event which is being skipped ends at the first line starting with "}"
+    :param line_start: The start of the first line to check
+    :param skipping: Whether the event is being skipped
+    :return: The position after the closing line (or the end of the file if there isn't one), and whether it was found
+    """
+    position = line_start
+    while True:
+        if mapped[position:position + 1] != b"}":
+            newline = mapped.find(b"\n}", position)
+            if newline == -1:
+                return len(mapped), False
+            position = newline + 1
+        line_end = _line_end(mapped, position)
+        if skipping or mapped[position:line_end].decode(encoding).rstrip() == "}":
+            return line_end, True
+        position = line_end
+
+
+# feed_parallel splits files into shards of about this size. Smaller shards would cost more to hand to workers
+# than they save, and larger ones would make the parent hold more parsed events at once
+_parallel_min_shard_size = 1024 * 1024
+
+# Shards per worker which are parsed ahead of the one being yielded. Their events are held by the parent process
+# until they are yielded, so this bounds its memory regardless of the file's size
+_parallel_shards_in_flight_per_worker = 2
+
+
+def _shard_bounds(mapped: mmap.mmap, shards: int, encoding: str) -> List[int]:
+    """
+    Split a demoinfogo output file into about `shards` pieces of similar size,
+    each starting right after a line which is exactly "}" (the end of an event)
+    :return: The start of every shard, followed by the end of the file
+    """
+    size = len(mapped)
+    bounds = [0]
+    for shard in range(1, shards):
+        target = size * shard // shards
+        if target <= bounds[-1]:
+            continue
+        end, closed = _event_end(mapped, mapped.rfind(b"\n", 0, target) + 1, False, encoding)
+        if not closed or end >= size:
+            break
+        if end > bounds[-1]:
+            bounds.append(end)
+    bounds.append(size)
+    return bounds
+
+
+def _parse_shard(path: Union[str, PathLike], start: int, end: int, line_number: int,
+                 event_types: AbstractSet[str]) -> Tuple[List[Dict], bool, int]:
+    """
+    Parse one shard of a demoinfogo output file in a worker process
+    :param line_number: The line number of the shard's first line
+    :return: The shard's events, whether it ended inside an event, and the line number after its last line
+    """
+    with open(path, "rb") as output_file:
+        output_file.seek(start)
+        data = output_file.read(end - start)
+    parser = EventParser(event_types)
+    parser._line_number = line_number
+    events = list(parser._feed_range(data, 0, len(data), locale.getpreferredencoding(False)))
+    return events, parser._building_event or parser._skipping_event, parser.line_count
+
+
+def _decode_lines(mapped: mmap.mmap, start: int, end: int, encoding: str) -> List[str]:
+    text = mapped[start:end].decode(encoding)
+    if "\r" in text:  # Translate newlines like text mode does
+        text = text.replace("\r\n", "\n")
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+class EventParser:
+    """
+    Incremental parser for demoinfogo output. State is kept between calls to feed,
+    so output can be parsed as it is produced, including events which are split between calls
+    """
+
+    def __init__(self, event_types: AbstractSet[str] = None):
+        """
+        :param event_types: If given, only these event types are parsed and yielded.
+            The set is read on every event, so adding to it takes effect immediately
+        """
+        self.event_types = event_types
+        self._current_event = {}
+        # (indentation of the key which owns the dict, dict) for every dict the next line could belong to
+        self._stack = [(0, self._current_event)]
+        self._last_indent = 0
+        self._last_container = None
+        self._last_key = None
+        self._building_event = False
+        self._skipping_event = False
+        self._last_line = None
+        self._line_number = 0
+
+    @property
+    def line_count(self) -> int:
+        """
+        The amount of lines parsed (or skipped) so far
+        """
+        return self._line_number
+
+    def feed_parallel(self, path: Union[str, PathLike], workers: int = None) -> Iterator[Dict]:
+        """
+        Parse a demoinfogo output file in worker processes. The file is split into shards at the ends of events,
+        which are parsed concurrently and yielded shard by shard in file order (which is tick order), so the events
+        and their line numbers are the same as from feed. Files too small to be worth splitting are parsed in order
+        instead, as is everything from a shard which turns out to end inside an event
+        :param path: The path to a demoinfogo output file
+        :param workers: The amount of worker processes. Defaults to the amount of CPUs
+        :yield: Every event in the file
+        """
+        workers = workers or os.cpu_count() or 1
+        encoding = locale.getpreferredencoding(False)
+        bounds = []
+        line_numbers = [self._line_number]
+        with open(path, "rb") as output_file:
+            size = os.fstat(output_file.fileno()).st_size
+            # Shards must start between events, so a parser which is inside one has to carry on in order
+            if workers > 1 and size >= 2 * _parallel_min_shard_size and \
+                    not (self._building_event or self._skipping_event):
+                with mmap.mmap(output_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    if mapped.find(b"\r") == -1 or _lone_carriage_return.search(mapped) is None:
+                        shards = size // _parallel_min_shard_size
+                        bounds = _shard_bounds(mapped, shards, encoding)
+                        for start, end in zip(bounds, bounds[1:-1]):
+                            line_numbers.append(line_numbers[-1] + mapped[start:end].count(b"\n"))
+        if len(bounds) < 3:
+            with open(path) as output_file:
+                yield from self.feed(output_file)
+            return
+
+        from concurrent.futures import ProcessPoolExecutor  # Only imported when it's used, as it's slow to import
+
+        shard_count = len(bounds) - 1
+        in_flight = workers * _parallel_shards_in_flight_per_worker
+        executor = ProcessPoolExecutor(max_workers=min(workers, shard_count))
+        futures = {}
+
+        def submit(shard: int):
+            if shard < shard_count:
+                futures[shard] = executor.submit(_parse_shard, path, bounds[shard], bounds[shard + 1],
+                                                 line_numbers[shard], self.event_types)
+
+        try:
+            for shard in range(min(in_flight, shard_count)):
+                submit(shard)
+            for shard in range(shard_count):
+                # Drop the future as soon as its events are taken, and start on the next shard in its place
+                events, unfinished, line_count = futures.pop(shard).result()
+                submit(shard + in_flight)
+                if unfinished:
+                    # The shard's end wasn't between events after all (or the file ends inside one),
+                    # so parse the rest of the file here, continuing from the end of the previous shard
+                    if shard < shard_count - 1:
+                        _logger.warning(f"Shard starting at line {line_numbers[shard]} of {path} ends inside an "
+                                        f"event; parsing the rest of the file in order")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    futures.clear()
+                    self._line_number = line_numbers[shard]
+                    with open(path, "rb") as output_file, \
+                            mmap.mmap(output_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        yield from self._feed_range(mapped, bounds[shard], len(mapped), encoding)
+                    return
+                yield from events
+                del events
+                self._line_number = line_count
+            # Every shard is done, so the workers can be joined rather than left to exit on their own
+            executor.shutdown()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _feed_range(self, mapped: Union[mmap.mmap, bytes], start: int, end: int, encoding: str) -> Iterator[Dict]:
+        """
+        Parse the lines from start to end in chunks of about _chunk_size bytes
+        """
+        while start < end:
+            chunk_end = min(_line_end(mapped, min(start + _chunk_size, end) - 1), end)
+            yield from self.feed(_decode_lines(mapped, start, chunk_end, encoding))
+            start = chunk_end
+
+    def feed(self, lines: Iterable[str]) -> Iterator[Dict]:
+        """
+        Parse demoinfogo output line by line
+        :param lines: The next demoinfogo output lines
+        :yield: Every event completed by these lines
+        """
+        # Work on locals; this loop runs once per output line
+        event_types = self.event_types
+        current_event = self._current_event
+        stack = self._stack
+        last_indent = self._last_indent
+        last_container = self._last_container
+        last_key = self._last_key
+        building_event = self._building_event
+        skipping_event = self._skipping_event
+        last_line = self._last_line
+        line_number = self._line_number - 1
+        converters = _converters
+        known_keys = _known_keys
+        try:
+            for line_number, line in enumerate(lines, self._line_number):
+                if skipping_event:
+                    # Only the closing brace of an event is unindented
+                    if line.startswith("}"):
+                        skipping_event = False
+                    continue
+
+                line = line.rstrip()
+
+                # Nearly every line is an indented key/value pair inside an event,
+                # so get everything else out of the way first
+                if not building_event or not line.startswith(" ") or line.endswith(_comment_suffixes):
+                    if line.startswith(_comment_prefixes) or line.endswith(_comment_suffixes):
+                        _logger.info(f"Skipping comment line {line_number}: {line}")
+                    elif not building_event:
+                        if event_types is not None and line not in event_types:
+                            skipping_event = True
+                            continue
+                        current_event["event_type"] = line
+                        current_event["line_number"] = line_number
+                        building_event = True
+                    elif line == "}":
+                        event = current_event
+                        building_event = False
+                        current_event = {}
+                        stack = [(0, current_event)]
+                        last_indent = 0
+                        last_key = None
+                        last_line = line
+                        yield event
+                        continue
+                    elif line != "{":
+                        _logger.warning(f"Skipping unindented line {line_number} inside an event: {line}")
+                    last_line = line
+                    continue
+
+                # Tokenize the key/value pair
+                stripped = line.lstrip(" ")
+                indent_amount = len(line) - len(stripped)
+                key, value = stripped.split(":", maxsplit=1)
+                key = known_keys.get(key, key)
+                converter = converters.get(key)
+                if converter is None:
+                    _logger.warning(f"Unknown key: {key}")
+                    data = {"data": value.strip()}
+                else:
+                    data = converter(value.strip(), last_line)
+
+                if indent_amount > last_indent:
+                    if last_key is not None:
+                        # The previous key owns this line
+                        parent = last_container[last_key]
+                        if not isinstance(parent, dict):
+                            parent = last_container[last_key] = {"data": parent}
+                        stack.append((last_indent, parent))
+                elif indent_amount < last_indent:
+                    while stack[-1][0] >= indent_amount:
+                        stack.pop()
+
+                last_container = stack[-1][1]
+                last_container[key] = data
                 last_key = key
                 last_indent = indent_amount
+                last_line = line
+        finally:
+            self._current_event = current_event
+            self._stack = stack
+            self._last_indent = last_indent
+            self._last_container = last_container
+            self._last_key = last_key
+            self._building_event = building_event
+            self._skipping_event = skipping_event
+            self._last_line = last_line
+            self._line_number = line_number + 1
 
-                if indent_amount == 1:
-                    current_event[key] = data
-                else:
-                    current_event[parent_key][key] = data
-            last_line = line
+
+def _parse_position(value: str, last_line: str) -> Dict:
+    x, y, z = value.split(",")
+    return {
+        "x": float(x),
+        "y": float(y),
+        "z": float(z)
+    }
+
+
+def _parse_facing(value: str, last_line: str) -> Dict:
+    _, pitch, yaw = value.split(":")
+    return {
+        "pitch": float(pitch.split(",")[0]),
+        "yaw": float(yaw)
+    }
 
 
-def _parse_line(line: str, last_line: str) -> Tuple[int, str, Dict]:
+def _parse_user(value: str, last_line: str) -> Dict:
+    try:
+        *username, steamid64, player_id = value.split(" ")
+    except ValueError as e:
+        if last_line.startswith("Cannot find player"):
+            return {
+                "player_id": int(value)
+            }
+        raise e
+    return {
+        "username": intern(" ".join(username)),
+        "steamid64": intern(steamid64),
+        "player_id": intern(player_id.strip("id:()"))
+    }
+
+
+def _parse_simple(value: str, last_line: str) -> str:
+    return intern(value)
+
+
+def _parse_bool(value: str, last_line: str) -> bool:
+    return bool(int(value))
+
+
+def _parse_int(value: str, last_line: str) -> Union[int, str]:
+    return "" if value == "" else int(value)
+
+
+def _parse_float(value: str, last_line: str) -> Union[float, str]:
+    return "" if value == "" else float(value)
+
+
+def _build_converters() -> Dict[str, Callable[[str, str], Any]]:
     """
-    Parse a line of input from demoinfogo and return it as Python data
-    :param line: The line to parse
-    :param last_line: The last line that was parsed
-    :return: The indentation level of the line, the key on the line, and that key's value
+    Build the table which maps every known key to the function that converts its value
+    :return: A dict of key -> converter(value, last_line)
     """
+    converters = {
+        "position": _parse_position,
+        "facing": _parse_facing
+    }
+
     # Keys of the form <Username> <SteamID64> <Player ID>
     user_keys = ("userid", "attacker", "assister")
 
@@ -77,53 +423,16 @@ def _parse_line(line: str, last_line: str) -> Tuple[int, str, Dict]:
     # Keys with float values (or int keys which could theoretically hold float values)
     float_keys = ("theta", "phi", "inertia", "distance", "x", "y", "z", "blind_duration", "damage")
 
-    key, value = line.lstrip(" ").split(":", maxsplit=1)
-    value = value.strip()
-
-    indent_amount = len(line) - len(line.lstrip(" "))
-
-    if key == "position":
-        x, y, z = value.split(",")
-        data = {
-            "x": float(x),
-            "y": float(y),
-            "z": float(z)
-        }
-    elif key == "facing":
-        _, pitch, yaw = value.split(":")
-        pitch = float(pitch.split(",")[0])
-        yaw = float(yaw)
-        data = {
-            "pitch": pitch,
-            "yaw": yaw
-        }
-    elif key in user_keys:
-        try:
-            *username, steamid64, player_id = value.split(" ")
-            username = " ".join(username)
-            player_id = player_id.strip("id:()")
-            data = {
-                "username": username,
-                "steamid64": steamid64,
-                "player_id": player_id
-            }
-        except ValueError as e:
-            if last_line.startswith("Cannot find player"):
-                data = {
-                    "player_id": int(value)
-                }
-            else:
-                raise e
-    elif key in simple_keys:
-        data = value
-    elif key in bool_keys:
-        data = bool(int(value))
-    elif key in int_keys:
-        data = "" if value == "" else int(value)
-    elif key in float_keys:
-        data = "" if value == "" else float(value)
-    else:
-        _logger.warning(f"Unknown key: {key}")
-        data = {"data": value}
+    # Earlier tables take precedence, matching the order the keys used to be checked in
+    for keys, converter in ((user_keys, _parse_user), (simple_keys, _parse_simple), (bool_keys, _parse_bool),
+                            (int_keys, _parse_int), (float_keys, _parse_float)):
+        for key in keys:
+            converters.setdefault(key, converter)
+
+    return converters
+
+
+_converters = _build_converters()
 
-    return indent_amount, key, data
+# One shared string per known key, so that events don't each hold their own copies
+_known_keys = {key: key for key in _converters}
@@ -0,0 +1,96 @@
+from collections import Counter
+from dataclasses import dataclass, field, asdict
+import json
+import sys
+import time
+from typing import Dict, Iterable, Iterator
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def _peak_rss_mb(who: int) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+@dataclass
+class PipelineStats:
+    """
+    Timings and counters for one run of the demo pipeline.
+    Stage times are wall-clock seconds. demoinfogo runs concurrently with parsing, so its stage overlaps the others,
+    and "parse" includes any time spent waiting for demoinfogo to produce output.
+    lines_per_sec and events_per_sec are both measured against the "parse" stage
+    """
+    stages: Dict[str, float] = field(default_factory=dict)
+    lines: int = 0
+    events: int = 0
+    event_counts: Dict[str, int] = field(default_factory=Counter)
+    cache_hit: bool = False
+    peak_rss_mb: float = None
+    peak_child_rss_mb: float = None
+
+    @property
+    def lines_per_sec(self) -> float:
+        parse_time = self.stages.get("parse")
+        return self.lines / parse_time if parse_time else 0.0
+
+    @property
+    def events_per_sec(self) -> float:
+        parse_time = self.stages.get("parse")
+        return self.events / parse_time if parse_time else 0.0
+
+    def add_stage_time(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def count_lines(self, lines: Iterable[str]) -> Iterator[str]:
+        """
+        Pass lines through, counting them
+        """
+        for line in lines:
+            self.lines += 1
+            yield line
+
+    def time_events(self, events: Iterable[dict]) -> Iterator[dict]:
+        """
+        Pass events through, counting them by type and adding the time spent producing them to the "parse" stage
+        """
+        clock = time.perf_counter
+        event_counts = self.event_counts
+        events = iter(events)
+        parse_time = 0.0
+        try:
+            while True:
+                start = clock()
+                try:
+                    event = next(events)
+                finally:
+                    parse_time += clock() - start
+                event_counts[event["event_type"]] += 1
+                yield event
+        except StopIteration:
+            pass
+        finally:
+            self.events = sum(event_counts.values())
+            self.add_stage_time("parse", parse_time)
+
+    def record_peak_rss(self):
+        """
+        Record the peak resident set size of this process and of its finished children (demoinfogo), where supported
+        """
+        if resource is not None:
+            self.peak_rss_mb = _peak_rss_mb(resource.RUSAGE_SELF)
+            self.peak_child_rss_mb = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+
+    def to_dict(self) -> dict:
+        stats = asdict(self)
+        stats["event_counts"] = dict(self.event_counts)
+        stats["lines_per_sec"] = self.lines_per_sec
+        stats["events_per_sec"] = self.events_per_sec
+        return stats
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
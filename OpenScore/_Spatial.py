@@ -0,0 +1,293 @@
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+import math
+from typing import Any, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from OpenScore._Export import _steamid
+
+try:
+    import numpy as np
+except ImportError:  # Only needed for queries
+    np = None
+
+_DEFAULT_CELL_SIZE = 256.0  # Game units; maps are roughly 4000-8000 units across
+
+
+class Position(NamedTuple):
+    match: int
+    round: int
+    steamid: int
+    tick: int
+    x: float
+    y: float
+    z: float
+
+
+@dataclass
+class Heatmap:
+    """
+    Point counts on a grid. counts[row][column] covers
+    x from min_x + column * cell_size and y from min_y + row * cell_size, cell_size units in each direction
+    """
+    min_x: float
+    min_y: float
+    cell_size: float
+    counts: List[List[int]]
+
+    @property
+    def max_count(self) -> int:
+        return max((max(row) for row in self.counts if row), default=0)
+
+
+@dataclass
+class _Grid:
+    """
+    The positions of a SpatialIndex sorted by match, grid cell and tick. Bucket b (one per occupied match and cell)
+    holds the sorted positions whose keys are from b * tick_span to (b + 1) * tick_span - 1
+    """
+    # Per bucket
+    match: Any
+    cell_x: Any
+    cell_y: Any
+    # Per sorted position: bucket * tick_span + the tick's key, the index's row and the coordinates
+    keys: Any
+    rows: Any
+    x: Any
+    y: Any
+    z: Any
+    min_tick: int
+    tick_span: int
+    # The distinct ticks, if ticks are keyed by their rank among them instead of by tick - min_tick
+    ticks: Any = None
+
+
+class SpatialIndex:
+    """
+    Grid index over positions (buckets of cell_size units per match, each sorted by tick)
+    for box, radius and heatmap queries that only look at the buckets they overlap.
+    Build it from a gamestate, a single round, death positions or exported columns, or add positions yourself;
+    the buckets are (re)built on the first query after positions are added. Queries require NumPy
+    """
+
+    def __init__(self, cell_size: float = _DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.match = array("i")
+        self.round = array("i")
+        self.steamid = array("Q")
+        self.tick = array("q")
+        self.x = array("d")
+        self.y = array("d")
+        self.z = array("d")
+        self._grid: Optional[_Grid] = None
+
+    @classmethod
+    def from_gamestate(cls, gamestate: Any, round_index: int = None, match: int = 0,
+                       cell_size: float = _DEFAULT_CELL_SIZE) -> "SpatialIndex":
+        """
+        Index the orientation history of every player
+        :param gamestate: The GameState to index
+        :param round_index: If given, only index this round
+        :param match: The match number to store with the positions
+        :param cell_size: The width and height of the grid cells
+        :raises ValueError: If the rounds have been released (retain="aggregates")
+        """
+        index = cls(cell_size)
+        index.add_gamestate(gamestate, round_index, match)
+        return index
+
+    @classmethod
+    def from_deaths(cls, gamestate: Any, match: int = 0, cell_size: float = _DEFAULT_CELL_SIZE) -> "SpatialIndex":
+        """
+        Index where players died: their last recorded position at or before each death
+        :raises ValueError: If rounds have been released (retain="aggregates")
+        """
+        gamestate.require_records("SpatialIndex.from_deaths")
+        index = cls(cell_size)
+        for round_index, game_round in enumerate(gamestate.rounds):
+            for player in game_round.players.values():
+                history = player.orientation_history
+                for death in player.deaths:
+                    row = bisect_right(history.tick, death.tick) - 1
+                    if row >= 0:
+                        index.add(history.x[row], history.y[row], history.z[row], death.tick,
+                                  _steamid(player.steamid64), round_index, match)
+        return index
+
+    @classmethod
+    def from_columns(cls, stores: Iterable[Any], cell_size: float = _DEFAULT_CELL_SIZE) -> "SpatialIndex":
+        """
+        Index the positions tables of exported demos (see load_columns), numbering matches in order
+        """
+        index = cls(cell_size)
+        for match, store in enumerate(stores):
+            positions = store["positions"]
+            index.match.extend(array("i", [match]) * len(positions))
+            for column in ("round", "steamid", "tick", "x", "y", "z"):
+                getattr(index, column).frombytes(positions[column].tobytes())
+        index._grid = None
+        return index
+
+    def add_gamestate(self, gamestate: Any, round_index: int = None, match: int = 0):
+        gamestate.require_records("SpatialIndex", round_index)
+        rounds = enumerate(gamestate.rounds) if round_index is None else [(round_index,
+                                                                           gamestate.rounds[round_index])]
+        for index, game_round in rounds:
+            for player in game_round.players.values():
+                history = player.orientation_history
+                self.match.extend(array("i", [match]) * len(history))
+                self.round.extend(array("i", [index]) * len(history))
+                self.steamid.extend(array("Q", [_steamid(player.steamid64)]) * len(history))
+                self.tick.extend(history.tick)
+                self.x.extend(history.x)
+                self.y.extend(history.y)
+                self.z.extend(history.z)
+        self._grid = None
+
+    def add(self, x: float, y: float, z: float, tick: int, steamid: int = 0, round_index: int = 0, match: int = 0):
+        self.match.append(match)
+        self.round.append(round_index)
+        self.steamid.append(steamid)
+        self.tick.append(tick)
+        self.x.append(x)
+        self.y.append(y)
+        self.z.append(z)
+        self._grid = None
+
+    def __len__(self):
+        return len(self.tick)
+
+    def position(self, row: int) -> Position:
+        return Position(self.match[row], self.round[row], self.steamid[row], self.tick[row],
+                        self.x[row], self.y[row], self.z[row])
+
+    def _cell(self, coordinate: float) -> int:
+        return math.floor(coordinate / self.cell_size)
+
+    def _build(self) -> _Grid:
+        if np is None:
+            raise ImportError("NumPy is required for SpatialIndex queries")
+        match = np.array(self.match, dtype=np.int64)
+        tick = np.array(self.tick, dtype=np.int64)
+        x = np.array(self.x, dtype=np.float64)
+        y = np.array(self.y, dtype=np.float64)
+        cell_x = np.floor(x / self.cell_size).astype(np.int64)
+        cell_y = np.floor(y / self.cell_size).astype(np.int64)
+
+        # A tick is keyed by its offset from the first tick, or by its rank if the ticks are too far apart for
+        # bucket * tick_span + offset to fit in 64 bits
+        min_tick = int(tick.min()) if len(tick) else 0
+        tick_span = int(tick.max()) - min_tick + 1 if len(tick) else 1
+        ticks = None
+        tick_key = tick - min_tick
+        if len(tick) * tick_span >= 2 ** 62:
+            ticks, tick_key = np.unique(tick, return_inverse=True)
+            tick_span = len(ticks)
+
+        order = None
+        if len(tick):
+            widths = [int(column.max() - column.min()) + 1 for column in (match, cell_x, cell_y)]
+            if widths[0] * widths[1] * widths[2] * tick_span < 2 ** 62:
+                # Sorting one combined match, cell and tick key is several times faster than lexsort
+                cell = ((match - match.min()) * widths[1] + cell_x - cell_x.min()) * widths[2] + cell_y - cell_y.min()
+                order = np.argsort(cell * tick_span + tick_key)
+        if order is None:
+            order = np.lexsort((tick_key, cell_y, cell_x, match))
+        match, cell_x, cell_y = match[order], cell_x[order], cell_y[order]
+        new_bucket = np.ones(len(order), dtype=bool)
+        new_bucket[1:] = (match[1:] != match[:-1]) | (cell_x[1:] != cell_x[:-1]) | (cell_y[1:] != cell_y[:-1])
+        starts = np.flatnonzero(new_bucket)
+
+        # Each bucket gets its own range of keys, so that one searchsorted finds a tick range in any bucket
+        keys = (np.cumsum(new_bucket) - 1) * tick_span + tick_key[order]
+
+        self._grid = _Grid(match[starts], cell_x[starts], cell_y[starts], keys, order, x[order], y[order],
+                           np.array(self.z, dtype=np.float64)[order], min_tick, tick_span, ticks)
+        return self._grid
+
+    def _select(self, min_x: float, min_y: float, max_x: float, max_y: float, min_z: float, max_z: float,
+                start_tick: Optional[int], end_tick: Optional[int], match: Optional[int]) -> Tuple[_Grid, Any]:
+        """
+        :return: The grid, and the sorted positions inside the box (inclusive) from start_tick to end_tick,
+            optionally only from one match
+        """
+        grid = self._grid if self._grid is not None else self._build()
+        overlapping = ((grid.cell_x >= self._cell(min_x)) & (grid.cell_x <= self._cell(max_x))
+                       & (grid.cell_y >= self._cell(min_y)) & (grid.cell_y <= self._cell(max_y)))
+        if match is not None:
+            overlapping &= grid.match == match
+        buckets = np.flatnonzero(overlapping)
+
+        # Slice the tick range out of every overlapping bucket
+        first_key, last_key = 0, grid.tick_span - 1
+        if grid.ticks is not None:
+            if start_tick is not None:
+                first_key = int(np.searchsorted(grid.ticks, start_tick, "left"))
+            if end_tick is not None:
+                last_key = int(np.searchsorted(grid.ticks, end_tick, "right")) - 1
+        else:
+            if start_tick is not None:
+                first_key = min(max(start_tick - grid.min_tick, 0), grid.tick_span)
+            if end_tick is not None:
+                last_key = min(end_tick - grid.min_tick, grid.tick_span - 1)
+        starts = np.searchsorted(grid.keys, buckets * grid.tick_span + first_key, "left")
+        ends = np.searchsorted(grid.keys, buckets * grid.tick_span + last_key, "right")
+        lengths = (ends - starts).clip(min=0)
+        candidates = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+
+        x, y, z = grid.x[candidates], grid.y[candidates], grid.z[candidates]
+        inside = (min_x <= x) & (x <= max_x) & (min_y <= y) & (y <= max_y) & (min_z <= z) & (z <= max_z)
+        return grid, candidates[inside]
+
+    def box(self, min_x: float, min_y: float, max_x: float, max_y: float, min_z: float = -math.inf,
+            max_z: float = math.inf, start_tick: int = None, end_tick: int = None, match: int = None) -> List[int]:
+        """
+        :return: The rows of every position inside the box (inclusive) from start_tick to end_tick,
+            optionally only from one match. Pass rows to position() for their values
+        """
+        grid, selected = self._select(min_x, min_y, max_x, max_y, min_z, max_z, start_tick, end_tick, match)
+        return grid.rows[selected].tolist()
+
+    def radius(self, x: float, y: float, radius: float, z: float = None, start_tick: int = None,
+               end_tick: int = None, match: int = None) -> List[int]:
+        """
+        :return: The rows of every position within radius of (x, y), or of (x, y, z) if z is given,
+            from start_tick to end_tick, optionally only from one match
+        """
+        grid, selected = self._select(x - radius, y - radius, x + radius, y + radius, -math.inf, math.inf,
+                                      start_tick, end_tick, match)
+        distance_squared = (grid.x[selected] - x) ** 2 + (grid.y[selected] - y) ** 2
+        if z is not None:
+            distance_squared += (grid.z[selected] - z) ** 2
+        return grid.rows[selected[distance_squared <= radius * radius]].tolist()
+
+    def players_in_box(self, min_x: float, min_y: float, max_x: float, max_y: float, **options) -> Set[int]:
+        """
+        :return: The steamid64 of everyone who was in the box; takes the same options as box()
+        """
+        return {self.steamid[row] for row in self.box(min_x, min_y, max_x, max_y, **options)}
+
+    def heatmap(self, cell_size: float = None, bounds: Tuple[float, float, float, float] = None,
+                start_tick: int = None, end_tick: int = None, match: int = None) -> Heatmap:
+        """
+        Count positions per grid cell
+        :param cell_size: The width and height of the heatmap cells (default: the index's cell size)
+        :param bounds: (min_x, min_y, max_x, max_y) to cover (default: every position)
+        :return: The counts, with rows along y and columns along x
+        """
+        cell_size = self.cell_size if cell_size is None else cell_size
+        if bounds is None:
+            if not len(self):
+                return Heatmap(0.0, 0.0, cell_size, [])
+            grid = self._grid if self._grid is not None else self._build()
+            bounds = (float(grid.x.min()), float(grid.y.min()), float(grid.x.max()), float(grid.y.max()))
+        min_x, min_y, max_x, max_y = bounds
+        columns = max(math.floor((max_x - min_x) / cell_size) + 1, 1)
+        rows = max(math.floor((max_y - min_y) / cell_size) + 1, 1)
+
+        grid, selected = self._select(min_x, min_y, max_x, max_y, -math.inf, math.inf, start_tick, end_tick, match)
+        # Floored like the grid's own cells; histogram2d's float bin edges can put a point on an edge in either cell
+        column = np.floor((grid.x[selected] - min_x) / cell_size).astype(np.int64)
+        row = np.floor((grid.y[selected] - min_y) / cell_size).astype(np.int64)
+        counts = np.bincount(row * columns + column, minlength=rows * columns).reshape(rows, columns)
+        return Heatmap(min_x, min_y, cell_size, counts.tolist())
@@ -0,0 +1,383 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+import OpenScore._Constants as Constants
+from OpenScore._Export import ColumnStore, _build_tables
+
+try:
+    import numpy as np
+except ImportError:  # Only needed for statistics
+    np = None
+
+# The tables statistics are computed from
+_stat_tables = ("rounds", "players", "shots", "hits", "deaths")
+
+# Parts of the names of weapons whose shots and hits don't count towards accuracy
+_utility_weapons = ("knife", "bayonet", "grenade", "flashbang", "molotov", "decoy", "inferno", "c4")
+
+_default_trade_window_ticks = 5 * 128
+
+# The trade ticks of a player round whose deaths weren't traded at all
+_no_trade = 2 ** 62
+
+# The rounds columns statistics keep
+_round_columns = ("match", "round", "start_tick", "end_tick", "winner", "end_reason", "overtime")
+
+_hitgroup_codes = list(Constants.hitgroup_names)
+hitgroup_names = list(Constants.hitgroup_names.values()) + ["Other"]
+
+
+@dataclass
+class Stats:
+    """
+    Scoreboard statistics, as dicts of column name -> NumPy array:
+        players: One row per player (by steamid64) across every round and match
+        player_rounds: One row per player per round, with the match, round and steamid of the row
+        rounds: One row per round, with its outcome
+        matches: One row per match
+    "hitgroups" (players, player_rounds and matches), "winners" and "end_reasons" (matches) are dicts of
+    Constants.hitgroup_names/round_end_winners/round_end_reasons name -> column
+    """
+    players: Dict[str, Any]
+    player_rounds: Dict[str, Any]
+    rounds: Dict[str, Any]
+    matches: Dict[str, Any]
+
+    def player(self, steamid64: Union[int, str]) -> Dict[str, Any]:
+        """
+        :return: The match totals of one player as a dict of plain Python values
+        """
+        row = int(np.searchsorted(self.players["steamid"], np.uint64(steamid64)))
+        if row == len(self.players["steamid"]) or self.players["steamid"][row] != np.uint64(steamid64):
+            raise KeyError(steamid64)
+        return _row(self.players, row)
+
+
+def _row(table: Dict[str, Any], row: int) -> Dict[str, Any]:
+    return {
+        name: _row(column, row) if isinstance(column, dict) else column[row].item()
+        for name, column in table.items()
+    }
+
+
+def _divide(numerator, denominator, scale: float = 1.0):
+    """
+    Element-wise numerator / denominator * scale, with 0 where the denominator is 0
+    """
+    out = np.zeros(len(numerator), dtype=np.float64)
+    np.divide(numerator * scale, denominator, out=out, where=denominator > 0)
+    return out
+
+
+def _utility_mask(codes, categories: List[str]):
+    """
+    :return: For each row of a dictionary-encoded weapon column, whether the weapon is utility
+    """
+    is_utility = np.array([any(part in weapon for part in _utility_weapons) for weapon in categories] + [False])
+    return is_utility[codes] if len(codes) else np.zeros(0, dtype=bool)
+
+
+def _source_columns(source: Any, round_indexes: Iterable[int] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Get the stats columns of a GameState or ColumnStore as NumPy arrays, without copying them
+    :param round_indexes: If given, only get these rounds of a GameState
+    """
+    if isinstance(source, ColumnStore):
+        columns = {table: {column: np.asarray(source[table][column]) for column in source[table].keys()}
+                   for table in _stat_tables}
+        categories = {table: source.categories(table, "weapon") for table in ("shots", "hits")}
+    else:
+        tables = _build_tables(source, _stat_tables, round_indexes)
+        columns = {name: {column: np.asarray(memoryview(values)) for column, values in table.columns.items()}
+                   for name, table in tables.items()}
+        categories = {name: list(tables[name].categories["weapon"]) for name in ("shots", "hits")}
+
+    # Weapon codes differ between sources, so resolve them here
+    for table in ("shots", "hits"):
+        columns[table]["utility"] = _utility_mask(columns[table]["weapon"], categories[table])
+    return columns
+
+
+def _concatenate(sources: List[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Stack the tables of several matches, adding a "match" column and numbering rounds across all of them
+    """
+    # Rounds which have been folded into StatsAggregates are missing, so number past the last round of each match
+    round_offsets = np.cumsum([0] + [int(source["rounds"]["round"].max()) + 1 if len(source["rounds"]["round"]) else 0
+                                     for source in sources])
+    columns = {}
+    for table in _stat_tables:
+        stacked = {column: np.concatenate([source[table][column] for source in sources])
+                   for column in sources[0][table]}
+        lengths = [len(source[table]["round"]) for source in sources]
+        stacked["match"] = np.repeat(np.arange(len(sources)), lengths)
+        stacked["global_round"] = stacked["round"] + np.repeat(round_offsets[:-1], lengths)
+        columns[table] = stacked
+    return columns
+
+
+def _lookup(keys, values):
+    """
+    :param keys: A sorted array
+    :return: The index of every value in keys, and whether it was found
+    """
+    index = np.searchsorted(keys, values)
+    found = index < len(keys)
+    found[found] = keys[index[found]] == values[found]
+    return np.where(found, index, 0), found
+
+
+def _sum_by(groups, size: int, weights=None):
+    return np.bincount(groups, weights=weights, minlength=size)
+
+
+def _named_counts(codes, names: Dict[int, str], groups, size: int) -> Dict[str, Any]:
+    """
+    :return: name -> count of the rows with that name's code, per group
+    """
+    return {name: _sum_by(groups[codes == code], size).astype(np.int64) for code, name in names.items()}
+
+
+def _count_cells(data: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Count everything that only depends on one round, per player round ("cell")
+    :param data: The stats tables of one or more matches (see _concatenate)
+    :return: The cells, in match, round and steamid order, and the rounds
+    """
+    rounds, players, shots, hits, deaths = (data[table] for table in _stat_tables)
+
+    # A cell is keyed by global round * player count + player index
+    known = players["steamid"] != 0
+    steamids = np.unique(players["steamid"][known])
+    player_count = len(steamids)
+    cell_player = np.searchsorted(steamids, players["steamid"][known])
+    cell_keys, first = np.unique(players["global_round"][known].astype(np.int64) * player_count + cell_player,
+                                 return_index=True)
+    cell_count = len(cell_keys)
+    cell_player = cell_player[first]
+
+    def cells(table: Dict[str, Any], steamid_column: str):
+        player, found = _lookup(steamids, table[steamid_column])
+        cell, in_round = _lookup(cell_keys, table["global_round"].astype(np.int64) * player_count + player)
+        return cell, found & in_round
+
+    # Kills, deaths and assists
+    victim, victim_ok = cells(deaths, "steamid")
+    killer, killer_ok = cells(deaths, "attacker_steamid")
+    assister, assister_ok = cells(deaths, "assister_steamid")
+    kill_ok = killer_ok & (deaths["attacker_steamid"] != deaths["steamid"])
+    headshot = kill_ok & (deaths["headshot"] == 1)
+
+    # Damage, capped at the health the victim had left. Hits are grouped by victim in tick order
+    order = np.lexsort((hits["tick"], hits["global_round"], hits["match"], hits["steamid"]))
+    health = hits["health"][order]
+    dmg_health = hits["dmg_health"][order].clip(min=0)
+    previous_health = np.full(len(order), 100, dtype=np.int64)
+    same_victim = (hits["steamid"][order][1:] == hits["steamid"][order][:-1]) & \
+                  (hits["global_round"][order][1:] == hits["global_round"][order][:-1])
+    previous_health[1:][same_victim] = health[:-1][same_victim]
+    damage = np.empty(len(order), dtype=np.int64)
+    damage[order] = np.where(health >= 0, np.minimum(dmg_health, (previous_health - health).clip(min=0)),
+                             dmg_health)
+
+    attacker, attacker_ok = cells(hits, "attacker_steamid")
+    attacker_ok &= hits["attacker_steamid"] != hits["steamid"]
+
+    # Accuracy and hit groups
+    shooter, shooter_ok = cells(shots, "steamid")
+    weapon_shot = shooter_ok & ~shots["utility"]
+    weapon_hit = attacker_ok & ~hits["utility"]
+
+    hitgroup = np.full(len(hits["hitgroup"]), len(_hitgroup_codes))
+    for column, code in enumerate(_hitgroup_codes):
+        hitgroup[hits["hitgroup"] == code] = column
+    cell_hitgroups = _sum_by(attacker[weapon_hit] * len(hitgroup_names) + hitgroup[weapon_hit],
+                             cell_count * len(hitgroup_names)).reshape(cell_count, len(hitgroup_names))
+
+    # Trades: the fewest ticks after one of the cell's deaths that its killer died, so that any window can be applied
+    death_tick = np.full(cell_count, -1, dtype=np.int64)
+    death_tick[victim[victim_ok]] = deaths["tick"][victim_ok]
+    killer_death_tick = np.where(kill_ok, death_tick[killer], -1)
+    tradable = kill_ok & victim_ok & (killer_death_tick >= deaths["tick"])
+    trade_ticks = np.full(cell_count, _no_trade, dtype=np.int64)
+    np.minimum.at(trade_ticks, victim[tradable], (killer_death_tick - deaths["tick"])[tradable])
+
+    counts = {
+        "match": players["match"][known][first],
+        "round": players["round"][known][first],
+        "steamid": steamids[cell_player],
+        "kills": _sum_by(killer[kill_ok], cell_count).astype(np.int64),
+        "deaths": _sum_by(victim[victim_ok], cell_count).astype(np.int64),
+        "assists": _sum_by(assister[assister_ok], cell_count).astype(np.int64),
+        "headshots": _sum_by(killer[headshot], cell_count).astype(np.int64),
+        "damage": _sum_by(attacker[attacker_ok], cell_count, damage[attacker_ok]).astype(np.int64),
+        "shots": _sum_by(shooter[weapon_shot], cell_count).astype(np.int64),
+        "hits": _sum_by(attacker[weapon_hit], cell_count).astype(np.int64),
+        "hitgroups": cell_hitgroups.astype(np.int64),
+        "trade_ticks": trade_ticks
+    }
+    return counts, {name: rounds[name] for name in _round_columns}
+
+
+def _stack(parts: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Combine cells and rounds from _count_cells, back in match, round and steamid order
+    """
+    cells = {name: np.concatenate([part[0][name] for part in parts]) for name in parts[0][0]}
+    rounds = {name: np.concatenate([part[1][name] for part in parts]) for name in parts[0][1]}
+    cell_order = np.lexsort((cells["steamid"], cells["round"], cells["match"]))
+    round_order = np.lexsort((rounds["round"], rounds["match"]))
+    return ({name: column[cell_order] for name, column in cells.items()},
+            {name: column[round_order] for name, column in rounds.items()})
+
+
+class StatsAggregates:
+    """
+    Per player round counters of the first round_count rounds of a gamestate, counted as each round ends (see Demo's
+    count_rounds and retain="aggregates"). compute_stats counts those rounds from here instead of walking their raw
+    records, which retain="aggregates" releases
+    """
+
+    def __init__(self):
+        self.round_count = 0
+        self._parts: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+
+    def fold(self, gamestate: Any, round_index: int):
+        """
+        Count a round of the gamestate. Rounds must be folded in order, each once
+        """
+        if np is None:
+            raise ImportError("NumPy is required for StatsAggregates")
+        self._parts.append(_count_cells(_concatenate([_source_columns(gamestate, [round_index])])))
+        self.round_count = round_index + 1
+
+    def columns(self, match: int = 0) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        :return: The cells and rounds counted so far (see _count_cells), numbered as the given match
+        """
+        if len(self._parts) > 1:
+            self._parts = [_stack(self._parts)]
+        cells, rounds = self._parts[0]
+        return ({**cells, "match": np.full(len(cells["match"]), match)},
+                {**rounds, "match": np.full(len(rounds["match"]), match)})
+
+
+def compute_stats(sources: Union[Any, Iterable[Any]], trade_window_ticks: int = _default_trade_window_ticks) -> Stats:
+    """
+    Compute scoreboard statistics (kills, deaths, assists, ADR, HS%, KAST, accuracy and hit groups)
+    with vectorized NumPy operations.
+    Damage is capped at the victim's remaining health; utility weapons and knives don't count towards accuracy.
+    A death is traded if its killer dies within trade_window_ticks of it.
+    Rounds which a gamestate has folded into its aggregates (count_rounds or retain="aggregates") are counted
+    from those
+    :param sources: A GameState or ColumnStore (see load_columns), or several to combine into per-player totals
+    :param trade_window_ticks: The amount of ticks within which a death can be traded
+    :return: Statistics per player, per player per round, per round and per match
+    """
+    if np is None:
+        raise ImportError("NumPy is required for compute_stats")
+
+    if isinstance(sources, ColumnStore) or hasattr(sources, "rounds"):
+        sources = [sources]
+    tables = []
+    folded = []
+    for match, source in enumerate(sources):
+        aggregates = getattr(source, "aggregates", None)
+        if aggregates is not None and aggregates.round_count:
+            tables.append(_source_columns(source, range(aggregates.round_count, len(source.rounds))))
+            folded.append(aggregates.columns(match))
+        else:
+            tables.append(_source_columns(source))
+    cells, rounds = _count_cells(_concatenate(tables))
+    if folded:
+        cells, rounds = _stack([(cells, rounds)] + folded)
+    return _summarize(cells, rounds, len(sources), trade_window_ticks)
+
+
+def _summarize(cells: Dict[str, Any], rounds: Dict[str, Any], match_count: int, trade_window_ticks: int) -> Stats:
+    """
+    Compute the statistics from cells and rounds (see _count_cells)
+    """
+    steamids, cell_player = np.unique(cells["steamid"], return_inverse=True)
+    player_count = len(steamids)
+    round_count = len(rounds["round"])
+    round_stride = int(rounds["round"].max()) + 1 if round_count else 1
+    cell_round = np.searchsorted(rounds["match"].astype(np.int64) * round_stride + rounds["round"],
+                                 cells["match"].astype(np.int64) * round_stride + cells["round"])
+
+    cell_kills, cell_deaths, cell_assists, cell_headshots, cell_damage = (
+        cells[name] for name in ("kills", "deaths", "assists", "headshots", "damage"))
+
+    # KAST: a kill, assist, survival or trade in the round
+    cell_traded = cells["trade_ticks"] <= trade_window_ticks
+    cell_survived = cell_deaths == 0
+    cell_kast = (cell_kills > 0) | (cell_assists > 0) | cell_survived | cell_traded
+
+    player_rounds = {
+        "match": rounds["match"][cell_round],
+        "round": rounds["round"][cell_round],
+        "steamid": steamids[cell_player],
+        "kills": cell_kills,
+        "deaths": cell_deaths,
+        "assists": cell_assists,
+        "headshots": cell_headshots,
+        "damage": cell_damage,
+        "shots": cells["shots"],
+        "hits": cells["hits"],
+        "survived": cell_survived,
+        "traded": cell_traded,
+        "kast": cell_kast,
+        "hitgroups": {name: np.ascontiguousarray(cells["hitgroups"][:, column])
+                      for column, name in enumerate(hitgroup_names)}
+    }
+
+    def player_total(column):
+        return _sum_by(cell_player, player_count, column).astype(np.int64)
+
+    totals = {name: player_total(player_rounds[name])
+              for name in ("kills", "deaths", "assists", "headshots", "damage", "shots", "hits", "kast")}
+    rounds_played = _sum_by(cell_player, player_count)
+    player_stats = {
+        "steamid": steamids,
+        "rounds": rounds_played,
+        **{name: column for name, column in totals.items() if name != "kast"},
+        "kast_rounds": totals["kast"],
+        "adr": _divide(totals["damage"], rounds_played),
+        "hs_percent": _divide(totals["headshots"], totals["kills"], 100),
+        "kast": _divide(totals["kast"], rounds_played, 100),
+        "accuracy": _divide(totals["hits"], totals["shots"], 100),
+        "kd": _divide(totals["kills"], np.maximum(totals["deaths"], 1)),
+        "hitgroups": {name: player_total(column) for name, column in player_rounds["hitgroups"].items()}
+    }
+
+    # Rounds and matches
+    round_stats = {
+        "match": rounds["match"],
+        "round": rounds["round"],
+        "start_tick": rounds["start_tick"],
+        "end_tick": rounds["end_tick"],
+        "winner": rounds["winner"],
+        "end_reason": rounds["end_reason"],
+        "overtime": rounds["overtime"] == 1,
+        "kills": _sum_by(cell_round, round_count, cell_kills).astype(np.int64),
+        "headshots": _sum_by(cell_round, round_count, cell_headshots).astype(np.int64),
+        "damage": _sum_by(cell_round, round_count, cell_damage).astype(np.int64)
+    }
+
+    def match_total(column):
+        return _sum_by(rounds["match"], match_count, column).astype(np.int64)
+
+    match_stats = {
+        "match": np.arange(match_count),
+        "rounds": _sum_by(rounds["match"], match_count),
+        "kills": match_total(round_stats["kills"]),
+        "headshots": match_total(round_stats["headshots"]),
+        "damage": match_total(round_stats["damage"]),
+        "winners": _named_counts(rounds["winner"], Constants.round_end_winners, rounds["match"], match_count),
+        "end_reasons": _named_counts(rounds["end_reason"], Constants.round_end_reasons, rounds["match"],
+                                     match_count),
+        "hitgroups": {name: _sum_by(rounds["match"][cell_round], match_count, column).astype(np.int64)
+                      for name, column in player_rounds["hitgroups"].items()}
+    }
+
+    return Stats(player_stats, player_rounds, round_stats, match_stats)
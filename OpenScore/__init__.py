@@ -1,19 +1,67 @@
+from array import array
+from bisect import bisect_right
+import codecs
 from collections import defaultdict
+import contextlib
 from dataclasses import dataclass, field
+import hashlib
+import importlib
+import locale
 import logging
 import math
 from os import PathLike
 from pathlib import Path
-import subprocess
-from typing import Dict, Union, List, Iterable, Tuple
-
-import yaml
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Union, List, Iterable, Iterator, Optional, Tuple
 
 import OpenScore._Parser as Parser
 import OpenScore._Constants as Constants
+from OpenScore._Cache import DemoCache
+from OpenScore._Config import load_config
+from OpenScore._Index import TickIndex
+from OpenScore._Profile import PipelineStats
+
+if TYPE_CHECKING:
+    import asyncio
+
+    from OpenScore._Batch import BatchReport, BatchResult, process_many, process_many_async
+    from OpenScore._Export import ColumnStore, export_columns, load_columns
+    from OpenScore._Spatial import Heatmap, Position, SpatialIndex
+    from OpenScore._Stats import Stats, StatsAggregates, compute_stats
 
 _logger = logging.getLogger(__name__)
 
+# Public names from submodules which pull in asyncio, concurrent.futures or NumPy.
+# They are imported on first use, so that processing a single demo doesn't pay for them at startup
+_lazy_attributes = {
+    "BatchReport": "OpenScore._Batch",
+    "BatchResult": "OpenScore._Batch",
+    "process_many": "OpenScore._Batch",
+    "process_many_async": "OpenScore._Batch",
+    "ColumnStore": "OpenScore._Export",
+    "export_columns": "OpenScore._Export",
+    "load_columns": "OpenScore._Export",
+    "Heatmap": "OpenScore._Spatial",
+    "Position": "OpenScore._Spatial",
+    "SpatialIndex": "OpenScore._Spatial",
+    "Stats": "OpenScore._Stats",
+    "StatsAggregates": "OpenScore._Stats",
+    "compute_stats": "OpenScore._Stats",
+}
+
+
+def __getattr__(name: str):
+    module_name = _lazy_attributes.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attributes))
+
 
 # TODO see usage; there must be a better way to do that with dataclasses
 def _defaultdict_int():
@@ -26,7 +74,12 @@ def _add_dict_keys_to_obj(keys: Iterable[str], from_dict: dict, obj: object):
     Update references only; do not copy object values.
     """
     for k in keys:
-        obj.__dict__[k] = from_dict[k]
+        setattr(obj, k, from_dict[k])
+
+
+def _read_lines(path: Union[str, PathLike]) -> Iterator[str]:
+    with open(path) as file:
+        yield from file
 
 
 def str_to_path(path: Union[str, PathLike]) -> PathLike:
@@ -45,16 +98,73 @@ class Weapon:
     pass
 
 
-class Shot:
-    pass
+class _Record:
+    """
+    Base for compact event records. Subclasses list the event keys they keep in __slots__
+    """
+    __slots__ = ()
 
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
 
-class Hit:
-    pass
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={getattr(self, k)!r}' for k in self.__slots__)})"
 
 
-class Death:
-    pass
+class Shot(_Record):
+    __slots__ = ("userid", "weapon", "silenced", "tick")
+
+
+class Hit(_Record):
+    __slots__ = ("userid", "attacker", "health", "armor", "weapon", "dmg_health", "dmg_armor", "hitgroup", "tick")
+
+
+class Death(_Record):
+    __slots__ = ("userid", "attacker", "assister", "assistedflash", "weapon", "weapon_itemid", "headshot",
+                 "penetrated", "tick")
+
+
+class OrientationHistory:
+    """
+    Columnar store of a player's orientation updates, with one typed array per value.
+    Indexing and iterating return rows in the {"position": ..., "facing": ..., "tick": ...} layout;
+    rows are copies, so changing them doesn't change the history.
+    """
+    __slots__ = ("tick", "x", "y", "z", "pitch", "yaw")
+
+    def __init__(self):
+        self.tick = array("q")
+        self.x = array("d")
+        self.y = array("d")
+        self.z = array("d")
+        self.pitch = array("d")
+        self.yaw = array("d")
+
+    def append(self, position: dict, facing: dict, tick: int):
+        self.tick.append(tick)
+        self.x.append(position["x"])
+        self.y.append(position["y"])
+        self.z.append(position["z"])
+        self.pitch.append(facing["pitch"])
+        self.yaw.append(facing["yaw"])
+
+    def _row(self, index: int) -> Dict[str, Dict]:
+        return {
+            "position": {"x": self.x[index], "y": self.y[index], "z": self.z[index]},
+            "facing": {"pitch": self.pitch[index], "yaw": self.yaw[index]},
+            "tick": self.tick[index]
+        }
+
+    def __len__(self):
+        return len(self.tick)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self._row(i) for i in range(*index.indices(len(self)))]
+        return self._row(index)
+
+    def __iter__(self):
+        return (self._row(i) for i in range(len(self)))
 
 
 @dataclass
@@ -65,8 +175,9 @@ class Player:
     kills: List[Death] = field(default_factory=list)
     deaths: List[Death] = field(default_factory=list)
     assists: List[Death] = field(default_factory=list)
-    last_orientation: dict = field(default_factory=dict)
-    orientation_history: List[Dict[str, Dict]] = field(default_factory=list)
+    orientation_history: OrientationHistory = field(default_factory=OrientationHistory)
+    steamid64: str = None
+    username: str = None
     footsteps: int = 0
     started_with_bomb: int = False
     bomb_carry_intervals: List[Tuple[int, int]] = field(default_factory=list)
@@ -75,24 +186,42 @@ class Player:
 
     _bomb_carry_start: int = None
 
+    @property
+    def last_orientation(self) -> dict:
+        """
+        The most recent orientation update, or an empty dict if there hasn't been one
+        """
+        if len(self.orientation_history) == 0:
+            return {}
+        return self.orientation_history[-1]
+
     def update_orientation(self, orientation_data: dict, tick: int):
         """
-        Set self.last_orientation's "position" and "facing" keys with the values in the given dict
+        Record the "position" and "facing" values in the given dict
         :param orientation_data: A dict with "position" and "facing" keys
         :param tick: The tick that the orientation data comes from
         """
         steamid64 = orientation_data.get("steamid64")
         if steamid64 is not None and steamid64 != "0":
-            last_orientation = {
-                "position": orientation_data["position"],
-                "facing": orientation_data["facing"],
-                "tick": tick
-            }
-            self.last_orientation = last_orientation
-            self.orientation_history.append(last_orientation)
+            if self.steamid64 is None:
+                self.steamid64 = steamid64
+                self.username = orientation_data.get("username")
+            self.orientation_history.append(orientation_data["position"], orientation_data["facing"], tick)
         else:
             _logger.info("Ignoring position update for player 0")
 
+    def release_records(self):
+        """
+        Drop the shots, hits, kills, deaths, assists and orientation history, once they have been counted
+        """
+        self.shots = []
+        self.hits_given = []
+        self.hits_taken = []
+        self.kills = []
+        self.deaths = []
+        self.assists = []
+        self.orientation_history = OrientationHistory()
+
 
 class Round:
     def __init__(self, start_tick: int, overtime: bool = False):
@@ -101,36 +230,709 @@ class Round:
         self.start_tick = start_tick
         self.end_tick = None
         self.end_reason = None
+        self.winner = None
 
 
 @dataclass
 class GameState:
     round: int = 0
     match_is_live: bool = False
+    match_is_over: bool = False
     score: dict = field(default_factory=_defaultdict_int)
     rounds: List[Round] = field(default_factory=list)
+    round_start_ticks: List[int] = field(default_factory=list)
+    players_by_steamid: Dict[str, Dict[int, Player]] = field(default_factory=dict)
+    events: Dict[str, TickIndex] = field(default_factory=dict)
+    # With count_rounds or retain="aggregates", the counts of every round that is over
+    aggregates: Optional["StatsAggregates"] = None
+    # The amount of rounds, from the first, whose shots, hits, kills, deaths, assists and orientation history are gone
+    released_rounds: int = 0
 
     _can_buy: bool = False
     _overtime: bool = False
     _overtime_count = 0
+    _overtime_score_target: int = None
+    _restart_counter: int = 0  # For ESEA demos
+
+    def start_round(self, start_tick: int, overtime: bool = False) -> Round:
+        """
+        Append a new round. Rounds must be started in tick order
+        """
+        new_round = Round(start_tick=start_tick, overtime=overtime)
+        self.rounds.append(new_round)
+        self.round_start_ticks.append(start_tick)
+        return new_round
+
+    def index_round(self, round_index: int):
+        """
+        Add the players of a round to players_by_steamid
+        """
+        for player in self.rounds[round_index].players.values():
+            if player.steamid64 is not None:
+                self.players_by_steamid.setdefault(player.steamid64, {})[round_index] = player
+
+    def index_event(self, event: dict):
+        """
+        Add an event to the tick index of its event type
+        """
+        event_index = self.events.get(event["event_type"])
+        if event_index is None:
+            event_index = self.events[event["event_type"]] = TickIndex()
+        event_index.add(event["tick"], event)
+
+    def round_index_at(self, tick: int) -> Optional[int]:
+        """
+        :return: The index in self.rounds of the round which contains the tick, or None if it is before the first round
+        """
+        round_index = bisect_right(self.round_start_ticks, tick) - 1
+        return round_index if round_index >= 0 else None
+
+    def round_at(self, tick: int) -> Optional[Round]:
+        """
+        :return: The round which contains the tick, or None if it is before the first round
+        """
+        round_index = self.round_index_at(tick)
+        return self.rounds[round_index] if round_index is not None else None
+
+    def events_between(self, event_type: str, start_tick: int, end_tick: int) -> List[dict]:
+        """
+        :return: Every indexed event of the given type from start_tick to end_tick, inclusive, in tick order.
+            Events are only indexed with Demo(..., index_events=True)
+        """
+        event_index = self.events.get(event_type)
+        return event_index.between(start_tick, end_tick) if event_index is not None else []
+
+    def events_at(self, tick: int) -> Dict[str, List[dict]]:
+        """
+        :return: event_type -> every indexed event of that type which happened on the tick.
+            Events are only indexed with Demo(..., index_events=True)
+        """
+        events = {}
+        for event_type, event_index in self.events.items():
+            tick_events = event_index.between(tick, tick)
+            if tick_events:
+                events[event_type] = tick_events
+        return events
+
+    def player_rounds(self, steamid64: str) -> Dict[int, Player]:
+        """
+        :return: round index -> the player's data for that round
+        """
+        return self.players_by_steamid.get(steamid64, {})
+
+    def require_records(self, reader: str, round_index: int = None):
+        """
+        Make sure that the raw records a reader needs haven't been released (see Demo's retain="aggregates")
+        :param reader: The name of what reads the records, for the error
+        :param round_index: If given, only this round's records are needed
+        :raises ValueError: If they have been released
+        """
+        if self.released_rounds > (0 if round_index is None else round_index):
+            raise ValueError(f"{reader} reads raw records, which have been released for the first "
+                             f'{self.released_rounds} rounds. Process the demo with retain="all" instead')
+
+    def kills_by(self, steamid64: str) -> List["Death"]:
+        """
+        :return: Every kill by the player across the match, in round order
+        :raises ValueError: If rounds have been released (retain="aggregates")
+        """
+        self.require_records("kills_by")
+        return [kill for player in self.player_rounds(steamid64).values() for kill in player.kills]
+
+
+@dataclass
+class HandlerTiming:
+    calls: int = 0
+    total_time: float = 0.0
+
+    @property
+    def mean_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+EventHandler = Callable[["Demo", dict], None]
+
+# event_type -> the handlers to call for live events of that type, in registration order
+_event_handlers: Dict[str, List[EventHandler]] = defaultdict(list)
+
+
+def register_handler(event_type: str, handler: EventHandler = None):
+    """
+    Register a handler to be called as handler(demo, event) for every live event of the given type.
+    Can be used as a decorator. Handlers registered here apply to every Demo created afterwards
+    :param event_type: The demoinfogo event type, e.g. "player_death"
+    :param handler: The handler. If omitted, a decorator which registers the decorated function is returned
+    """
+    if handler is None:
+        def decorator(func: EventHandler) -> EventHandler:
+            register_handler(event_type, func)
+            return func
+        return decorator
+
+    _event_handlers[event_type].append(handler)
+    return handler
+
+
+def _handler_name(handler: EventHandler) -> str:
+    return f"{getattr(handler, '__module__', None)}.{getattr(handler, '__qualname__', repr(handler))}"
+
+
+def _player_ids(event: dict) -> Tuple:
+    """
+    :return: The event's player, attacker and assister IDs, or None for each one that isn't present
+    """
+    # There will never be an attacker/assister without a player/attacker, so keep these nested
+    player_id, attacker_id, assister_id = None, None, None
+    if event.get("userid"):
+        player_id = event["userid"]["player_id"]
+        if event.get("attacker"):
+            attacker_id = event["attacker"]["player_id"]
+            if event.get("assister"):
+                assister_id = event["assister"]["player_id"]
+    return player_id, attacker_id, assister_id
+
+
+def _player_id(event: dict):
+    return event["userid"]["player_id"] if event.get("userid") else None
+
+
+# This occurs on the first tick of a new round
+# (When players respawn at the buyzones)
+@register_handler("round_prestart")
+def _on_round_prestart(demo: "Demo", event: dict):
+    gamestate = demo.gamestate
+    gamestate.round += 1
+    demo._start_round(event["tick"], overtime=gamestate._overtime)
+    gamestate.round_start_tick = event["tick"]
+    gamestate._can_buy = True
+
+
+@register_handler("round_end")
+def _on_round_end(demo: "Demo", event: dict):
+    gamestate = demo.gamestate
+    if Constants.round_end_winners[event["winner"]] == "Terrorists":
+        gamestate.score["t"] += 1
+    elif Constants.round_end_winners[event["winner"]] == "Counter-Terrorists":
+        gamestate.score["ct"] += 1
+    gamestate.rounds[-1].end_reason = event["reason"]
+    gamestate.rounds[-1].winner = event["winner"]
+    gamestate.rounds[-1].end_tick = event["tick"]
+    gamestate.index_round(len(gamestate.rounds) - 1)
+
+    if demo._demo_type == "esea":
+        if gamestate._overtime:
+            # Someone won in overtime
+            if gamestate.score["t"] == gamestate._overtime_score_target or \
+                    gamestate.score["ct"] == gamestate._overtime_score_target:
+                gamestate.match_is_over = True
+                return
+
+            # Need another overtime
+            if gamestate.score["t"] == gamestate._overtime_score_target - 1 and \
+                    gamestate.score["ct"] == gamestate._overtime_score_target - 1:
+                gamestate._overtime_score_target += 3
+        else:
+            # Someone won
+            if gamestate.score["t"] == 16 or gamestate.score["ct"] == 16:
+                gamestate.match_is_over = True
+                return
+
+            # Overtime
+            if gamestate.score["t"] == 15 and gamestate.score["ct"] == 15:
+                gamestate._overtime = True
+                gamestate._overtime_score_target = 19
+
+        # Switch sides
+        if gamestate.round == 15:
+            if demo._demo_type == "esea":  # Must wait 3 more restarts
+                # NOTE: This means that all events after the "T/CTs win" message will be ignored
+                gamestate.match_is_live = False
+
+            temp_score = gamestate.score["t"]
+            gamestate.score["t"] = gamestate.score["ct"]
+            gamestate.score["ct"] = temp_score
+
+
+@register_handler("bomb_pickup")
+def _on_bomb_pickup(demo: "Demo", event: dict):
+    player = demo.current_players[_player_id(event)]
+    if event["tick"] == demo.gamestate.round_start_tick:
+        player.started_with_bomb = True
+
+    player._bomb_carry_start = event["tick"]
+
+
+@register_handler("bomb_dropped")
+@register_handler("bomb_planted")
+def _on_bomb_carry_end(demo: "Demo", event: dict):
+    player = demo.current_players[_player_id(event)]
+    player.bomb_carry_intervals.append((player._bomb_carry_start, event["tick"]))
+
+    if event["event_type"] == "bomb_planted":
+        player.bomb_planted_tick = event["tick"]
+
+
+@register_handler("bomb_begindefuse")
+def _on_bomb_begindefuse(demo: "Demo", event: dict):
+    defusal = Defusal()
+    _add_dict_keys_to_obj(
+        ["userid", "haskit", "tick"],
+        event,
+        defusal
+    )
+    demo.current_players[_player_id(event)].bomb_defusal_attempts.append(defusal)
+
+
+@register_handler("bomb_defused")
+def _on_bomb_defused(demo: "Demo", event: dict):
+    defusal = demo.current_players[_player_id(event)].bomb_defusal_attempts[-1]
+    defusal.success = True
+    defusal.defuse_tick = event["tick"]
+
+
+@register_handler("player_footstep")
+def _on_player_footstep(demo: "Demo", event: dict):
+    demo.current_players[_player_id(event)].footsteps += 1
+
+
+@register_handler("weapon_fire")
+def _on_weapon_fire(demo: "Demo", event: dict):
+    shot = Shot()
+    _add_dict_keys_to_obj(
+        Shot.__slots__,
+        event,
+        shot
+    )
+    demo.current_players[event["userid"]["player_id"]].shots.append(shot)
+
+
+@register_handler("player_death")
+def _on_player_death(demo: "Demo", event: dict):
+    players = demo.current_players
+    death = Death()
+    _add_dict_keys_to_obj(
+        Death.__slots__,
+        event,
+        death
+    )
+    player_id, attacker_id, assister_id = _player_ids(event)
+    players[player_id].deaths.append(death)
+    players[attacker_id].kills.append(death)
+    players[assister_id].assists.append(death)
+
+
+@register_handler("player_hurt")
+def _on_player_hurt(demo: "Demo", event: dict):
+    player_id, attacker_id, _ = _player_ids(event)
+    if player_id != 0:
+        players = demo.current_players
+        hit = Hit()
+        _add_dict_keys_to_obj(
+            Hit.__slots__,
+            event,
+            hit
+        )
+        players[player_id].hits_taken.append(hit)
+        players[attacker_id].hits_given.append(hit)
 
 
 class Demo:
     def __init__(self, demo_path: Union[str, PathLike], demo_type: str, config_path: Union[str, PathLike],
-                 skip_processing: bool = False):
+                 skip_processing: bool = False, tee_output: bool = False,
+                 output_path: Union[str, PathLike] = None, use_cache: bool = False, rebuild_cache: bool = False,
+                 parse_all_events: bool = False, handlers: Dict[str, List[EventHandler]] = None,
+                 time_handlers: bool = False, index_events: bool = False, profile: bool = False,
+                 cprofile_path: Union[str, PathLike] = None, parse_workers: int = None, retain: str = "all",
+                 count_rounds: bool = False):
+        """
+        :param demo_path: The CS:GO .dem file to process
+        :param demo_type: The matchmaking service the demo is from ("valve" or "esea")
+        :param config_path: The path to the config YAML or JSON file, or None to only use environment variables
+        :param skip_processing: Skip demoinfogo and parse a previously written output file instead
+        :param tee_output: Also write demoinfogo's output to disk while it is streamed into the parser
+        :param output_path: The demoinfogo output file to read (skip_processing) or write (tee_output).
+            Defaults to output.txt in the configured tmp_dir
+        :param use_cache: Load the gamestate from the demo cache if this demo has been processed before, and store
+            it there otherwise. A hit unpickles the whole gamestate, so it only pays off for demos that are analysed
+            repeatedly. The cache is never used with tee_output, which needs demoinfogo to run, or with time_handlers
+            or handlers from outside OpenScore, so that they see every event
+        :param rebuild_cache: Ignore any cached gamestate and overwrite it with a freshly parsed one. Implies use_cache
+        :param parse_all_events: Parse every event instead of only the types OpenScore acts on.
+            Only needed to record orientation updates from the other events (e.g. weapon_zoom)
+        :param handlers: Extra event_type -> handlers for this demo only, called after those from register_handler
+        :param time_handlers: Count and time every handler call in self.handler_timings
+        :param index_events: Keep every live event in the gamestate's per-event-type tick indexes, for
+            events_between and events_at. They roughly double the memory held after processing and the cache entry
+        :param profile: Collect stage timings, throughput, event counts and peak memory in self.stats
+        :param cprofile_path: If given, profile the event loop with cProfile and dump the stats to this file
+            once the gamestate is finished (for live demos, when finish() is called)
+        :param parse_workers: With skip_processing, parse shards of the output file in this many worker processes
+            while the gamestate is advanced with the events in order
+        :param retain: "all" to keep every shot, hit, death and orientation update of the match, or "aggregates"
+            to count each round's statistics once it is over (see StatsAggregates) and release its raw records,
+            so that memory stays bounded by one round. scoreboard() returns the same numbers either way.
+            Requires NumPy, and doesn't index events
+        :param count_rounds: Count each round's statistics once it is over, as retain="aggregates" does, but keep
+            its raw records. scoreboard() then only has to count the open round, instead of every record of the
+            match. Requires NumPy
+        """
+        start_time = time.perf_counter()
+        self._demo_path = str_to_path(demo_path)
+        self._setup(demo_type, config_path, parse_all_events, handlers, time_handlers, index_events, profile,
+                    cprofile_path, retain, count_rounds)
+        self._record_stage_time("setup", start_time)
+
+        # The demo file isn't read when skipping processing, so there is nothing to key the cache on. A hit wouldn't
+        # run demoinfogo, so tee_output would silently write nothing
+        cache, cache_key = self._open_cache((use_cache or rebuild_cache) and not skip_processing and not tee_output)
+        if cache is not None and not rebuild_cache:
+            self._load_from_cache(cache, cache_key)
+
+        if self.gamestate is None:
+            self._parse_demo(skip_processing, tee_output, output_path, parse_workers)
+            if cache is not None:
+                self._store_in_cache(cache, cache_key)
+
+        self._finish_stats(start_time)
+
+    @classmethod
+    async def from_demo_async(cls, demo_path: Union[str, PathLike], demo_type: str, config_path: Union[str, PathLike],
+                              semaphore: "asyncio.Semaphore" = None, tee_output: bool = False,
+                              output_path: Union[str, PathLike] = None, use_cache: bool = False,
+                              rebuild_cache: bool = False, **options) -> "Demo":
+        """
+        Process a demo without blocking the event loop. demoinfogo runs as an asyncio subprocess and its output
+        is fed to the parser as it arrives. Cache hashing and (un)pickling run in the default executor
+        :param demo_path: The CS:GO .dem file to process
+        :param demo_type: The matchmaking service the demo is from ("valve" or "esea")
+        :param config_path: The path to the config YAML or JSON file, or None to only use environment variables
+        :param semaphore: If given, held while demoinfogo runs to cap how many run concurrently
+        :param tee_output: Also write demoinfogo's output to disk while it is streamed into the parser
+        :param output_path: The file to write with tee_output. Defaults to output.txt in the configured tmp_dir
+        :param use_cache: Load the gamestate from the demo cache if this demo has been processed before, and store
+            it there otherwise. A hit unpickles the whole gamestate, so it only pays off for demos that are analysed
+            repeatedly. The cache is never used with tee_output, which needs demoinfogo to run, or with time_handlers
+            or handlers from outside OpenScore, so that they see every event
+        :param rebuild_cache: Ignore any cached gamestate and overwrite it with a freshly parsed one. Implies use_cache
+        :param options: parse_all_events, handlers, time_handlers, index_events, profile, cprofile_path, retain or
+            count_rounds,
+            as in __init__
+        :return: The processed Demo
+        """
+        import asyncio
+
+        start_time = time.perf_counter()
+        demo = cls.__new__(cls)
+        demo._demo_path = str_to_path(demo_path)
+        demo._setup(demo_type, config_path, **options)
+        demo._record_stage_time("setup", start_time)
+
+        cache, cache_key = await asyncio.to_thread(demo._open_cache, (use_cache or rebuild_cache) and not tee_output)
+        if cache is not None and not rebuild_cache:
+            await asyncio.to_thread(demo._load_from_cache, cache, cache_key)
+
+        if demo.gamestate is None:
+            if tee_output and output_path is None:
+                output_path = demo._default_output_path()
+            async with semaphore if semaphore is not None else contextlib.nullcontext():
+                await demo._parse_demo_async(output_path if tee_output else None)
+            if cache is not None:
+                await asyncio.to_thread(demo._store_in_cache, cache, cache_key)
+
+        demo._finish_stats(start_time)
+        return demo
+
+    def _open_cache(self, use_cache: bool) -> Tuple[Optional[DemoCache], Optional[str]]:
+        """
+        :return: The demo cache and this demo's key in it, or (None, None) if the cache isn't used
+        """
+        if not use_cache or not self._cacheable:
+            return None, None
+        cache = DemoCache.from_config(self._config)
+        return cache, cache.key(self._demo_path, self._demo_type, self._cache_variant)
+
+    def _load_from_cache(self, cache: DemoCache, cache_key: str):
+        cache_start_time = time.perf_counter()
+        self.gamestate = cache.load(cache_key)
+        self._record_stage_time("cache_load", cache_start_time)
+        if self.stats is not None:
+            self.stats.cache_hit = self.gamestate is not None
+
+    def _store_in_cache(self, cache: DemoCache, cache_key: str):
+        cache_start_time = time.perf_counter()
+        cache.store(cache_key, self.gamestate)
+        self._record_stage_time("cache_store", cache_start_time)
+
+    def _finish_stats(self, start_time: float):
+        if self.stats is not None:
+            self._record_stage_time("total", start_time)
+            self.stats.record_peak_rss()
+
+    def _setup(self, demo_type: str, config_path: Union[str, PathLike], parse_all_events: bool = False,
+               handlers: Dict[str, List[EventHandler]] = None, time_handlers: bool = False, index_events: bool = False,
+               profile: bool = False, cprofile_path: Union[str, PathLike] = None, retain: str = "all",
+               count_rounds: bool = False):
+        """
+        Set up everything but the gamestate. See __init__ for the parameters
+        """
+        if retain not in ("all", "aggregates"):
+            raise ValueError(f'retain must be "all" or "aggregates", not {retain!r}')
+        self._retain_aggregates = retain == "aggregates"
+        self._count_rounds = count_rounds or self._retain_aggregates
+        if self._count_rounds:
+            from OpenScore._Stats import np
+            if np is None:
+                raise ImportError('NumPy is required for count_rounds and retain="aggregates"')
+        if self._retain_aggregates:
+            # The event indexes would keep every event of the match
+            index_events = False
+
         # Convert string paths to path objects for ease of use
         self._demo_type = demo_type
-        self._demo_path = str_to_path(demo_path)
         self._config_path = str_to_path(config_path)
         self.gamestate = None
         self.tick_rate = 64 if demo_type == "valve" else 128  # TODO extract from demo
         self.freeze_time = 15
         self.buy_time = 20 if demo_type == "valve" else 15
+        self._buy_period_ticks = self.time_to_ticks(self.buy_time + self.freeze_time)
+        self._index_events = index_events
+        self._cprofile_path = cprofile_path
+        self._profiler = None
+        self.stats: PipelineStats = PipelineStats() if profile else None
+
+        self._handlers: Dict[str, List[EventHandler]] = {
+            event_type: list(event_handlers) for event_type, event_handlers in _event_handlers.items()
+        }
+        for event_type, event_handlers in (handlers or {}).items():
+            self._handlers.setdefault(event_type, []).extend(event_handlers)
+
+        # Cache entries are only valid for the handlers they were built with
+        handler_names = sorted(f"{event_type}:{_handler_name(handler)}"
+                               for event_type, event_handlers in self._handlers.items() for handler in event_handlers)
+        self._cache_variant = hashlib.sha1("\n".join(handler_names).encode()).hexdigest()[:12]
+        if parse_all_events:
+            self._cache_variant += "-all-events"
+        if index_events:
+            self._cache_variant += "-indexed"
+        if self._retain_aggregates:
+            self._cache_variant += "-aggregates"
+        elif self._count_rounds:
+            self._cache_variant += "-counted"
+
+        # Handlers are called as they are, so that the Demo stays picklable; with time_handlers each one is timed
+        # into the HandlerTiming at the same position in _handler_timing_lists
+        self.handler_timings: Dict[str, HandlerTiming] = None
+        self._handler_timing_lists: Dict[str, List[HandlerTiming]] = None
+        if time_handlers:
+            self.handler_timings = {}
+            self._handler_timing_lists = {}
+            for event_type, event_handlers in self._handlers.items():
+                for handler in event_handlers:
+                    self._add_handler_timing(event_type, handler)
+
+        # Handlers from outside OpenScore may keep state of their own, and handler timings are only collected while
+        # events are processed, so neither would see the events of a cached gamestate
+        self._cacheable = not time_handlers and all(
+            getattr(handler, "__module__", None) == __name__
+            for event_handlers in self._handlers.values() for handler in event_handlers)
+
+        # The parser skips every event that no handler needs. begin_new_match is needed to detect ESEA restarts
+        self._event_types = None if parse_all_events else set(self._handlers) | {"begin_new_match"}
+
+        self._config = self.load_config(self._config_path)
+
+    @classmethod
+    def live(cls, demo_type: str, config_path: Union[str, PathLike], **options) -> "Demo":
+        """
+        Create a Demo for a match in progress. Instead of processing a demo file, the gamestate is advanced
+        event by event as demoinfogo output is passed to feed or follow
+        :param demo_type: The matchmaking service the demo is from ("valve" or "esea")
+        :param config_path: The path to the config YAML or JSON file, or None to only use environment variables
+        :param options: parse_all_events, handlers, time_handlers, index_events, profile, cprofile_path, retain or
+            count_rounds,
+            as in __init__
+        :return: The new Demo, with an empty gamestate
+        """
+        demo = cls.__new__(cls)
+        demo._demo_path = None
+        demo._setup(demo_type, config_path, **options)
+        demo._start_stream()
+        return demo
+
+    def subscribe(self, event_type: str, callback: EventHandler):
+        """
+        Call callback(demo, event) for every live event of the given type from now on,
+        after the gamestate has been updated for the event
+        :param event_type: The demoinfogo event type, e.g. "round_end" or "player_death"
+        :param callback: The function to call
+        """
+        if self.handler_timings is not None:
+            self._add_handler_timing(event_type, callback)
+        self._handlers.setdefault(event_type, []).append(callback)
+        if self._event_types is not None:
+            self._event_types.add(event_type)
+
+    def _add_handler_timing(self, event_type: str, handler: EventHandler):
+        timing = self.handler_timings.setdefault(f"{event_type}:{_handler_name(handler)}", HandlerTiming())
+        self._handler_timing_lists.setdefault(event_type, []).append(timing)
+
+    def _call_timed_handlers(self, event: dict):
+        """
+        Call the event's handlers, counting and timing every call
+        """
+        event_type = event["event_type"]
+        clock = time.perf_counter
+        for handler, timing in zip(self._handlers.get(event_type, ()), self._handler_timing_lists.get(event_type, ())):
+            start = clock()
+            handler(self, event)
+            timing.total_time += clock() - start
+            timing.calls += 1
+
+    def feed(self, lines: Iterable[str]):
+        """
+        Advance the gamestate with the next lines of demoinfogo output.
+        Only the new lines are parsed; an event split between calls is completed by a later call
+        :param lines: The next lines of output. Trailing newlines are optional
+        """
+        if self.gamestate.match_is_over:
+            return
+        self._process_stream(lines)
+
+    def follow(self, output_path: Union[str, PathLike], poll_interval: float = 0.01,
+               stop: Callable[[], bool] = None):
+        """
+        Tail a growing demoinfogo output file, feeding each complete line as soon as it is written.
+        Returns once the match is over or stop() returns True
+        :param output_path: The output file to follow
+        :param poll_interval: The seconds to wait before checking for new output once the end of the file is reached
+        :param stop: Called whenever there is no new output; return True to stop following
+        """
+        partial_line = ""
+        with open(output_path) as output_file:
+            while not self.gamestate.match_is_over:
+                chunk = output_file.read(65536)
+                if chunk:
+                    lines = (partial_line + chunk).split("\n")
+                    # The last piece is either empty or a line which is still being written
+                    partial_line = lines.pop()
+                    self.feed(lines)
+                elif stop is not None and stop():
+                    # Nothing more is coming, so a last line without a newline is complete
+                    if partial_line:
+                        self.feed([partial_line])
+                    break
+                else:
+                    time.sleep(poll_interval)
+
+    def finish(self):
+        """
+        Finish the gamestate once there is no more output, indexing the last round if it never ended.
+        With cprofile_path, this is when the profile of every call so far is dumped
+        """
+        if self.gamestate.rounds:
+            self.gamestate.index_round(len(self.gamestate.rounds) - 1)
+        if self.gamestate.aggregates is not None:
+            self._fold_rounds()
+        if self._profiler is not None:
+            self._profiler.dump_stats(self._cprofile_path)
+            # Profilers can't be pickled, and the stats are in the dump now
+            self._profiler = None
+
+    def _start_stream(self):
+        """
+        Reset the gamestate and the parser
+        """
+        self.gamestate = GameState()
+        if self._count_rounds:
+            from OpenScore._Stats import StatsAggregates
+            self.gamestate.aggregates = StatsAggregates()
+        self._parser = Parser.EventParser(self._event_types)
+
+    def _start_round(self, start_tick: int, overtime: bool = False):
+        """
+        Start a new round. The round before it is indexed again, now that no more players can join it, and with
+        count_rounds or retain="aggregates" the rounds before it are counted
+        """
+        if self.gamestate.rounds:
+            # Players first seen after round_end (e.g. post-round kills) weren't in the round when it was indexed
+            self.gamestate.index_round(len(self.gamestate.rounds) - 1)
+        if self.gamestate.aggregates is not None:
+            self._fold_rounds()
+        self.gamestate.start_round(start_tick, overtime)
+
+    def _fold_rounds(self):
+        """
+        Count every round which hasn't been yet into the gamestate's aggregates.
+        With retain="aggregates", their raw records are then released
+        """
+        gamestate = self.gamestate
+        for round_index in range(gamestate.aggregates.round_count, len(gamestate.rounds)):
+            gamestate.aggregates.fold(gamestate, round_index)
+            if self._retain_aggregates:
+                for player in gamestate.rounds[round_index].players.values():
+                    player.release_records()
+                gamestate.released_rounds = round_index + 1
+
+    def _process_stream(self, lines: Iterable[str] = None, parallel_path: Union[str, PathLike] = None,
+                        parse_workers: int = None):
+        """
+        Parse lines with the demo's parser and advance the gamestate with the events
+        :param lines: The lines of demoinfogo output to parse
+        :param parallel_path: Instead of lines, a demoinfogo output file to parse shards of in worker processes
+        :param parse_workers: The amount of worker processes for parallel_path
+        """
+        if parallel_path is not None:
+            start_line_count = self._parser.line_count
+            events = self._parser.feed_parallel(parallel_path, parse_workers)
+        else:
+            if self.stats is not None:
+                lines = self.stats.count_lines(lines)
+            events = self._parser.feed(lines)
+        if self.stats is not None:
+            events = self.stats.time_events(events)
+
+        loop_start_time = time.perf_counter()
+        parse_time = self.stats.stages.get("parse", 0.0) if self.stats is not None else 0.0
+        # One profiler covers every call, from feed() too; finish() dumps it
+        if self._cprofile_path is not None and self._profiler is None:
+            import cProfile
+            self._profiler = cProfile.Profile()
+        try:
+            if self._profiler is not None:
+                self._profiler.enable()
+            self._process_events(events)
+        finally:
+            if self._profiler is not None:
+                self._profiler.disable()
+            # Stop parsing now if the match ended before the output did
+            events.close()
 
-        with open(self._config_path) as config_file:
-            self._config = yaml.safe_load(config_file)
+        if self.stats is not None:
+            if parallel_path is not None:
+                self.stats.lines += self._parser.line_count - start_line_count
+            # Everything in the event loop which wasn't spent producing events
+            parse_time = self.stats.stages["parse"] - parse_time
+            self.stats.add_stage_time("state_update", time.perf_counter() - loop_start_time - parse_time)
 
-        self._parse_demo(skip_processing)
+    def _record_stage_time(self, stage: str, start_time: float):
+        if self.stats is not None:
+            self.stats.add_stage_time(stage, time.perf_counter() - start_time)
+
+    @staticmethod
+    def load_config(config_path: Optional[Union[str, PathLike]]) -> dict:
+        """
+        Load an OpenScore config (see OpenScore._Config.load_config)
+        :param config_path: The path to the config YAML or JSON file, or None to only use environment variables
+        :return: The parsed config
+        """
+        return load_config(config_path)
+
+    @property
+    def current_players(self) -> Dict[int, Player]:
+        """
+        The players of the round currently being processed
+        """
+        return self.gamestate.rounds[-1].players
 
     def time_to_ticks(self, seconds: float) -> int:
         """
@@ -148,168 +950,177 @@ class Demo:
         """
         return math.ceil(ticks / self.tick_rate)
 
-    def _parse_demo(self, skip_processing: bool = False):
+    def scoreboard(self, trade_window: float = 5.0) -> "Stats":
+        """
+        Compute scoreboard statistics for this demo (requires NumPy; see compute_stats)
+        :param trade_window: The amount of seconds within which a death can be traded
+        :return: Statistics per player, per player per round, per round and for the match
+        """
+        from OpenScore._Stats import compute_stats
+        return compute_stats(self.gamestate, trade_window_ticks=self.time_to_ticks(trade_window))
+
+    def _demoinfogo_lines(self, output_path: PathLike = None) -> Iterator[str]:
+        """
+        Run demoinfogo on the demo and stream its output
+        :param output_path: If given, also write every line of output to this file
+        :yield: The next line of demoinfogo output
+        """
+        import subprocess
+
+        args = self._demoinfogo_args()
+
+        start_time = time.perf_counter()
+        with subprocess.Popen(args, stdout=subprocess.PIPE, text=True) as process:
+            output_file = open(output_path, "w") if output_path is not None else None
+            try:
+                for line in process.stdout:
+                    if output_file is not None:
+                        output_file.write(line)
+                    yield line
+            except GeneratorExit:
+                # The parser stopped early (e.g. the match ended); the rest of the output is not needed
+                process.kill()
+                raise
+            finally:
+                if output_file is not None:
+                    output_file.close()
+                # Also recorded when the match ends before the output does, which is the usual case
+                self._record_stage_time("demoinfogo", start_time)
+
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, args)
+
+    def _default_output_path(self) -> Path:
         tmp_dir = Path(self._config["tmp_dir"])
         tmp_dir.mkdir(parents=True, exist_ok=True)
+        return tmp_dir / Path("output.txt")
 
+    def _demoinfogo_args(self) -> list:
         demoinfogo_exe = Path(self._config["demoinfogo_path"]) / Path("demoinfogo")
-        output_path = tmp_dir / Path("output.txt")
+        return [demoinfogo_exe, self._demo_path, "-gameevents", "-extrainfo"]
+
+    async def _parse_demo_async(self, output_path: Union[str, PathLike] = None):
+        """
+        Run demoinfogo as an asyncio subprocess and feed its output to the parser as it arrives
+        :param output_path: If given, also write every line of output to this file
+        """
+        import asyncio
+        import subprocess
 
-        if not skip_processing:
-            with open(output_path, "w") as output_file:
-                subprocess.run([demoinfogo_exe, self._demo_path, "-gameevents", "-extrainfo"],
-                               stdout=output_file, check=True)
+        args = self._demoinfogo_args()
+        decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))()
 
-        # Reset the gamestate
-        self.gamestate = GameState()
+        self._start_stream()
+        start_time = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE)
+        output_file = open(output_path, "w") if output_path is not None else None
+        output_finished = False
+        try:
+            partial_line = ""
+            while not self.gamestate.match_is_over:
+                chunk = await process.stdout.read(65536)
+                if not chunk:
+                    output_finished = True
+                    break
+                text = decoder.decode(chunk)
+                if output_file is not None:
+                    output_file.write(text)
+                lines = (partial_line + text).split("\n")
+                # The last piece is either empty or a line which is still being written
+                partial_line = lines.pop()
+                self.feed(lines)
 
-        restart_counter = 0  # For ESEA demos
-        for event in Parser.parse(output_path):
+            if output_finished:
+                # Raises on an incomplete multibyte sequence at the very end of the output instead of dropping it
+                text = decoder.decode(b"", final=True)
+                if output_file is not None:
+                    output_file.write(text)
+                partial_line += text
+            if partial_line:
+                self.feed([partial_line])
+        finally:
+            if output_file is not None:
+                output_file.close()
+            if not output_finished and process.returncode is None:
+                # The match ended before the output did, or processing failed or was cancelled
+                process.kill()
+                # wait() also waits for stdout to close, which only happens once it is drained
+                while await process.stdout.read(65536):
+                    pass
+            await process.wait()
+            self._record_stage_time("demoinfogo", start_time)
+
+        if output_finished and process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, args)
+
+        self.finish()
+
+    def _parse_demo(self, skip_processing: bool = False, tee_output: bool = False,
+                    output_path: Union[str, PathLike] = None, parse_workers: int = None):
+        if output_path is None:
+            output_path = self._default_output_path()
+
+        self._start_stream()
+        if skip_processing and parse_workers is not None and parse_workers > 1:
+            self._process_stream(parallel_path=output_path, parse_workers=parse_workers)
+        else:
+            if skip_processing:
+                lines = _read_lines(output_path)
+            else:
+                lines = self._demoinfogo_lines(output_path if tee_output else None)
+            try:
+                self._process_stream(lines)
+            finally:
+                # Stop demoinfogo (or close the file) now if the match ended before the output did
+                lines.close()
+
+        self.finish()
+
+    def _process_events(self, events: Iterable[dict]):
+        """
+        Advance the gamestate with each event, stopping once the match is over
+        :param events: Parsed demoinfogo events
+        """
+        for event in events:
             if not self.gamestate.match_is_live:  # Ignore the warmup
                 if self._demo_type == "esea":
                     if event["event_type"] == "begin_new_match":
-                        restart_counter += 1
-                        if restart_counter == 4:
-                            restart_counter = 0
+                        self.gamestate._restart_counter += 1
+                        if self.gamestate._restart_counter == 4:
+                            self.gamestate._restart_counter = 0
                             self.gamestate.round += 1
                             self.gamestate.match_is_live = True
                             self.gamestate._can_buy = True
                             self.gamestate.round_start_tick = event["tick"]
-                            self.gamestate.rounds.append(Round(start_tick=event["tick"]))
+                            self._start_round(event["tick"])
                 elif self._demo_type == "valve":
                     raise NotImplementedError("Valve demos are not currently supported")
 
             else:  # Match is live
                 current_round_players = self.gamestate.rounds[-1].players
-                player_id, attacker_id, assister_id = None, None, None
 
-                # Set IDs and update last known positions
-                # There will never be an attacker/assister without a player/attacker, so keep these nested
-                if event.get("userid"):
-                    player_id = event["userid"]["player_id"]
+                # Update last known positions
+                player_id, attacker_id, assister_id = _player_ids(event)
+                if player_id is not None:
                     current_round_players[player_id].update_orientation(event["userid"], event["tick"])
-
-                    if event.get("attacker"):
-                        attacker_id = event["attacker"]["player_id"]
-                        current_round_players[attacker_id].update_orientation(event["attacker"], event["tick"])
-
-                        if event.get("assister"):
-                            assister_id = event["assister"]["player_id"]
-                            current_round_players[assister_id].update_orientation(event["assister"], event["tick"])
+                if attacker_id is not None:
+                    current_round_players[attacker_id].update_orientation(event["attacker"], event["tick"])
+                if assister_id is not None:
+                    current_round_players[assister_id].update_orientation(event["assister"], event["tick"])
 
                 # If buy_time + freeze_time seconds have passed, buy time has expired
                 if self.gamestate._can_buy and \
-                        self.ticks_to_time(
-                            event["tick"] - self.gamestate.round_start_tick) > self.buy_time + self.freeze_time:
+                        event["tick"] - self.gamestate.round_start_tick > self._buy_period_ticks:
                     self.gamestate._can_buy = False
 
-                # This occurs on the first tick of a new round
-                # (When players respawn at the buyzones)
-                if event["event_type"] == "round_prestart":
-                    self.gamestate.round += 1
-                    self.gamestate.rounds.append(Round(overtime=self.gamestate._overtime, start_tick=event["tick"]))
-                    self.gamestate.round_start_tick = event["tick"]
-                    self.gamestate._can_buy = True
-
-                elif event["event_type"] == "round_end":
-                    if Constants.round_end_winners[event["winner"]] == "Terrorists":
-                        self.gamestate.score["t"] += 1
-                    elif Constants.round_end_winners[event["winner"]] == "Counter-Terrorists":
-                        self.gamestate.score["ct"] += 1
-                    self.gamestate.rounds[-1].end_reason = event["reason"]
-                    self.gamestate.rounds[-1].end_tick = event["tick"]
-
-                    if self._demo_type == "esea":
-                        if self.gamestate._overtime:
-                            # Someone won in overtime
-                            if self.gamestate.score["t"] == overtime_score_target or \
-                                    self.gamestate.score["ct"] == overtime_score_target:
-                                break
-
-                            # Need another overtime
-                            if self.gamestate.score["t"] == overtime_score_target - 1 and \
-                                    self.gamestate.score["ct"] == overtime_score_target - 1:
-                                overtime_score_target += 3
-                        else:
-                            # Someone won
-                            if self.gamestate.score["t"] == 16 or self.gamestate.score["ct"] == 16:
-                                break
-
-                            # Overtime
-                            if self.gamestate.score["t"] == 15 and self.gamestate.score["ct"] == 15:
-                                self.gamestate._overtime = True
-                                overtime_score_target = 19
-
-                        # Switch sides
-                        if self.gamestate.round == 15:
-                            if self._demo_type == "esea":  # Must wait 3 more restarts
-                                # NOTE: This means that all events after the "T/CTs win" message will be ignored
-                                self.gamestate.match_is_live = False
-
-                            temp_score = self.gamestate.score["t"]
-                            self.gamestate.score["t"] = self.gamestate.score["ct"]
-                            self.gamestate.score["ct"] = temp_score
-
-                elif event["event_type"] == "bomb_pickup":
-                    if event["tick"] == self.gamestate.round_start_tick:
-                        current_round_players[player_id].started_with_bomb = True
-
-                    current_round_players[player_id]._bomb_carry_start = event["tick"]
-
-                elif event["event_type"] in ("bomb_dropped", "bomb_planted"):
-                    carry_start_tick = current_round_players[player_id]._bomb_carry_start
-                    carry_end_tick = event["tick"]
-                    current_round_players[player_id].bomb_carry_intervals.append((carry_start_tick, carry_end_tick))
-
-                    if event["event_type"] == "bomb_planted":
-                        current_round_players[player_id].bomb_planted_tick = event["tick"]
-
-                elif event["event_type"] == "bomb_begindefuse":
-                    defusal = Defusal()
-                    _add_dict_keys_to_obj(
-                        ["userid", "haskit", "tick"],
-                        event,
-                        defusal
-                    )
-                    current_round_players[player_id].bomb_defusal_attempts.append(defusal)
-
-                elif event["event_type"] == "bomb_defused":
-                    current_round_players[player_id].bomb_defusal_attempts[-1].success = True
-                    current_round_players[player_id].bomb_defusal_attempts[-1].defuse_tick = event["tick"]
-
-                elif event["event_type"] == "player_footstep":
-                    current_round_players[player_id].footsteps += 1
-
-                elif event["event_type"] == "weapon_fire":
-                    player_id = event["userid"]["player_id"]
-                    shot = Shot()
-                    _add_dict_keys_to_obj(
-                        ["userid", "weapon", "silenced", "tick"],
-                        event,
-                        shot
-                    )
-                    current_round_players[player_id].shots.append(shot)
-
-                elif event["event_type"] == "player_death":
-                    death = Death()
-                    _add_dict_keys_to_obj(
-                        ["userid", "attacker", "assister", "assistedflash", "weapon", "weapon_itemid", "headshot",
-                         "penetrated", "tick"],
-                        event,
-                        death
-                    )
-                    current_round_players[player_id].deaths.append(death)
-                    current_round_players[attacker_id].kills.append(death)
-                    current_round_players[assister_id].assists.append(death)
-
-                elif event["event_type"] == "player_hurt":
-                    if player_id != 0:
-                        hit = Hit()
-                        _add_dict_keys_to_obj(
-                            ["userid", "attacker", "health", "armor", "weapon", "dmg_health", "dmg_armor",
-                             "hitgroup", "tick"],
-                            event,
-                            hit
-                        )
-                        current_round_players[player_id].hits_taken.append(hit)
-                        current_round_players[attacker_id].hits_given.append(hit)
+                if self._handler_timing_lists is None:
+                    for handler in self._handlers.get(event["event_type"], ()):
+                        handler(self, event)
+                else:
+                    self._call_timed_handlers(event)
+
+                if self._index_events:
+                    self.gamestate.index_event(event)
+
+                if self.gamestate.match_is_over:
+                    break
@@ -0,0 +1,59 @@
+"""
+Benchmark for parsing one demoinfogo output file in worker processes (Parser.parse_parallel)
+against parsing it in order in this process (Parser.parse)
+
+Run from the repository root with `python -m benchmarks.bench_parallel`
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import OpenScore
+import OpenScore._Parser as Parser
+from benchmarks import synthetic
+
+
+def run(parse, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        events = sum(1 for _ in parse())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, events
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "output.txt")
+        with open(path, "w") as output_file:
+            for line in synthetic.generate(args.events, seed=args.seed):
+                output_file.write(line + "\n")
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        event_types = None if args.parse_all_events else set(OpenScore._event_handlers) | {"begin_new_match"}
+
+        print(f"{args.events} events, {size_mb:.1f} MB, {os.cpu_count()} CPUs (best of {args.repeat})")
+        sequential, expected = run(lambda: Parser.parse(path, event_types), args.repeat)
+        print(f"in order:  {sequential:.3f}s, {size_mb / sequential:.1f} MB/s, {expected} events")
+        for workers in args.workers:
+            best, events = run(lambda: Parser.parse_parallel(path, event_types, workers), args.repeat)
+            assert events == expected, f"{workers} workers: {events} events instead of {expected}"
+            print(f"{workers:>2} workers: {best:.3f}s, {size_mb / best:.1f} MB/s ({sequential / best:.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare parsing an output file in worker processes and in order")
+
+    parser.add_argument("--events", type=int, default=200000, help="The amount of synthetic events to write")
+
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8], help="The worker counts to time")
+
+    parser.add_argument("--repeat", type=int, default=3, help="The amount of timed runs")
+
+    parser.add_argument("--seed", type=int, default=0, help="The random seed for the synthetic data")
+
+    parser.add_argument("--parse-all-events", action="store_true",
+                        help="Parse every event type instead of the ones Demo handles")
+
+    main(parser.parse_args())
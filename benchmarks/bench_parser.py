@@ -0,0 +1,41 @@
+"""
+Micro-benchmark for OpenScore._Parser
+
+Run from the repository root with `python -m benchmarks.bench_parser`
+"""
+import argparse
+import time
+
+import OpenScore._Parser as Parser
+from benchmarks import synthetic
+
+
+def main(args):
+    lines = [line + "\n" for line in synthetic.generate(args.events, seed=args.seed)]
+    event_types = set(args.event_types) if args.event_types else None
+
+    best = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for _ in Parser.parse(lines, event_types):
+            pass
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    print(f"{len(lines)} lines, {args.events} events: best of {args.repeat} = {best:.3f}s, "
+          f"{len(lines) / best:,.0f} lines/sec, {args.events / best:,.0f} events/sec")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the demoinfogo output parser on synthetic data")
+
+    parser.add_argument("--events", type=int, default=100000, help="The amount of synthetic events to parse")
+
+    parser.add_argument("--repeat", type=int, default=5, help="The amount of timed runs")
+
+    parser.add_argument("--seed", type=int, default=0, help="The random seed for the synthetic data")
+
+    parser.add_argument("--event-types", nargs="+", metavar="EVENT_TYPE",
+                        help="Only parse these event types (see Parser.parse)")
+
+    main(parser.parse_args())
@@ -0,0 +1,137 @@
+"""
+Benchmark for OpenScore.compute_stats over a corpus of demos, against the equivalent Python loops
+
+Run from the repository root with `python -m benchmarks.bench_stats OUTPUT [OUTPUT ...]`,
+where every OUTPUT is a demoinfogo output file
+"""
+import argparse
+from collections import defaultdict
+from pathlib import Path
+import tempfile
+import time
+
+import OpenScore
+import OpenScore._Constants as Constants
+from OpenScore._Stats import _utility_weapons
+
+
+def python_stats(gamestate: OpenScore.GameState, trade_window_ticks: int = 5 * 128) -> dict:
+    """
+    The per-player totals of compute_stats, computed by walking the gamestate's objects
+    """
+    totals = defaultdict(lambda: defaultdict(int))
+    for game_round in gamestate.rounds:
+        death_ticks = {player.steamid64: player.deaths[-1].tick
+                       for player in game_round.players.values() if player.deaths}
+        in_round = {player.steamid64 for player in game_round.players.values()}
+        for player in game_round.players.values():
+            steamid64 = player.steamid64
+            if steamid64 is None:
+                continue
+            player_totals = totals[steamid64]
+            player_totals["rounds"] += 1
+            player_totals["deaths"] += len(player.deaths)
+            player_totals["assists"] += len(player.assists)
+
+            kills = 0
+            for kill in player.kills:
+                if kill.userid and kill.userid["steamid64"] != steamid64:
+                    kills += 1
+                    player_totals["headshots"] += kill.headshot
+            player_totals["kills"] += kills
+
+            previous_health = 100
+            for hit in player.hits_taken:
+                damage = min(hit.dmg_health, max(previous_health - hit.health, 0))
+                previous_health = hit.health
+                attacker = hit.attacker["steamid64"] if hit.attacker else None
+                if attacker is not None and attacker != steamid64 and attacker in in_round:
+                    totals[attacker]["damage"] += damage
+                    if not any(part in hit.weapon for part in _utility_weapons):
+                        totals[attacker]["hits"] += 1
+                        hitgroup = Constants.hitgroup_names.get(hit.hitgroup, "Other")
+                        totals[attacker][hitgroup] += 1
+
+            player_totals["shots"] += sum(not any(part in shot.weapon for part in _utility_weapons)
+                                          for shot in player.shots)
+
+            traded = False
+            for death in player.deaths:
+                killer = death.attacker["steamid64"] if death.attacker else None
+                if killer is not None and killer != steamid64 and killer in death_ticks:
+                    traded |= 0 <= death_ticks[killer] - death.tick <= trade_window_ticks
+            player_totals["kast_rounds"] += bool(kills or player.assists or not player.deaths or traded)
+    return totals
+
+
+def best_time(function, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def process(output_path: str, args, **options) -> OpenScore.GameState:
+    demo = OpenScore.Demo.live(args.type, args.config, **options)
+    with open(output_path) as output_file:
+        demo.feed(output_file)
+    demo.finish()
+    return demo.gamestate
+
+
+def main(args):
+    gamestates = [process(output_path, args) for output_path in args.outputs]
+    # The same, with every round counted as it ended
+    counted_gamestates = [process(output_path, args, count_rounds=True) for output_path in args.outputs]
+    rounds = sum(len(gamestate.rounds) for gamestate in gamestates)
+
+    python_time = best_time(lambda: [python_stats(gamestate) for gamestate in gamestates], args.repeat)
+    per_demo_time = best_time(lambda: [OpenScore.compute_stats(gamestate) for gamestate in gamestates], args.repeat)
+    batched_time = best_time(lambda: OpenScore.compute_stats(gamestates), args.repeat)
+    counted_time = best_time(lambda: [OpenScore.compute_stats(gamestate) for gamestate in counted_gamestates],
+                             args.repeat)
+
+    # Analytics jobs export once and compute from the memory-mapped columns
+    with tempfile.TemporaryDirectory() as export_dir:
+        stores = []
+        for index, gamestate in enumerate(gamestates):
+            OpenScore.export_columns(gamestate, Path(export_dir) / Path(str(index)))
+            stores.append(OpenScore.load_columns(Path(export_dir) / Path(str(index))))
+        columns_time = best_time(lambda: OpenScore.compute_stats(stores), args.repeat)
+
+    # The vectorized totals must match the Python ones
+    stats = OpenScore.compute_stats(gamestates)
+    expected = defaultdict(lambda: defaultdict(int))
+    for totals in map(python_stats, gamestates):
+        for steamid64, player_totals in totals.items():
+            for name, value in player_totals.items():
+                expected[int(steamid64)][name] += value
+    for row, steamid64 in enumerate(stats.players["steamid"].tolist()):
+        for name, value in expected[steamid64].items():
+            column = stats.players["hitgroups"][name] if name in stats.players["hitgroups"] else stats.players[name]
+            assert column[row] == value, f"{steamid64} {name}: {column[row]} != {value}"
+
+    print(f"{len(gamestates)} demos, {rounds} rounds, {len(stats.players['steamid'])} players (best of {args.repeat})")
+    print(f"python loops:          {python_time:.3f}s")
+    print(f"compute_stats/demo:    {per_demo_time:.3f}s ({python_time / per_demo_time:.1f}x)")
+    print(f"compute_stats/corpus:  {batched_time:.3f}s ({python_time / batched_time:.1f}x)")
+    print(f"compute_stats/export:  {columns_time:.3f}s ({python_time / columns_time:.1f}x)")
+    print(f"compute_stats/counted: {counted_time:.3f}s ({python_time / counted_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark vectorized scoreboard statistics over several demos")
+
+    parser.add_argument("outputs", nargs="+", metavar="OUTPUT", help="demoinfogo output files to compute stats for")
+
+    parser.add_argument("--type", default="esea", choices=["valve", "esea"],
+                        help="Signals the matchmaking service that the demos are from")
+
+    parser.add_argument("--config", default="config.yml", help="The path to the config YAML file")
+
+    parser.add_argument("--repeat", type=int, default=5, help="The amount of timed runs")
+
+    main(parser.parse_args())
@@ -0,0 +1,186 @@
+"""
+Benchmark suite: parse throughput, peak memory and end-to-end Demo time on a synthetic ESEA match
+
+Each run can be appended to a JSON lines file (--record) together with the commit it was measured at, and is compared
+against the last recorded run with the same settings, so that results can be tracked across commits.
+Run from the repository root with `python -m benchmarks.bench_suite`
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import OpenScore
+import OpenScore._Parser as Parser
+from benchmarks import synthetic
+
+REPOSITORY_DIR = Path(__file__).parent.parent
+
+# Metric -> whether a higher value is better
+METRICS = {
+    "parse_lines_per_sec": True,
+    "parse_mb_per_sec": True,
+    "demo_sec": False,
+    "demo_peak_mb": False
+}
+
+
+def best_time(run, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def git_commit() -> str:
+    """
+    :return: The short hash of the checked out commit, with "-dirty" appended if there are uncommitted changes
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPOSITORY_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPOSITORY_DIR,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + "-dirty" if status.strip() else commit
+
+
+def measure(args, tmp_dir: str) -> dict:
+    path = os.path.join(tmp_dir, "output.txt")
+    with open(path, "w") as output_file:
+        for line in synthetic.generate_match(args.rounds, args.players, args.events_per_round, args.overtimes,
+                                             seed=args.seed):
+            output_file.write(line + "\n")
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    with open(path) as output_file:
+        lines = sum(1 for _ in output_file)
+
+    config_path = os.path.join(tmp_dir, "config.json")
+    with open(config_path, "w") as config_file:
+        json.dump({"tmp_dir": tmp_dir}, config_file)
+
+    def demo():
+        return OpenScore.Demo(os.path.join(tmp_dir, "match.dem"), "esea", config_path, skip_processing=True,
+                              output_path=path, use_cache=False, retain=args.retain)
+
+    event_types = set(OpenScore._event_handlers) | {"begin_new_match"}
+    events = sum(1 for _ in Parser.parse(path))
+    parse_sec = best_time(lambda: sum(1 for _ in Parser.parse(path, event_types)), args.repeat)
+    demo_sec = best_time(demo, args.repeat)
+
+    # Tracing slows everything down, so the peak is taken from a separate, untimed run
+    tracemalloc.start()
+    rounds = len(demo().gamestate.rounds)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "size_mb": round(size_mb, 2),
+        "lines": lines,
+        "events": events,
+        "rounds": rounds,
+        "parse_lines_per_sec": round(lines / parse_sec),
+        "parse_mb_per_sec": round(size_mb / parse_sec, 2),
+        "demo_sec": round(demo_sec, 3),
+        "demo_peak_mb": round(peak / (1024 * 1024), 2)
+    }
+
+
+def last_record(record_path: str, settings: dict):
+    """
+    :return: The last record in the file which was measured with the same settings, or None
+    """
+    if not os.path.exists(record_path):
+        return None
+    last = None
+    with open(record_path) as record_file:
+        for line in record_file:
+            if line.strip():
+                record = json.loads(line)
+                if record["settings"] == settings:
+                    last = record
+    return last
+
+
+def main(args) -> int:
+    settings = {
+        "rounds": args.rounds,
+        "overtimes": args.overtimes,
+        "players": args.players,
+        "events_per_round": args.events_per_round,
+        "seed": args.seed,
+        "retain": args.retain
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results = measure(args, tmp_dir)
+
+    print(f"{results['rounds']} rounds, {results['events']} events, {results['lines']} lines, "
+          f"{results['size_mb']:.1f} MB (best of {args.repeat})")
+    previous = last_record(args.record, settings) if args.record else None
+    if previous is not None:
+        print(f"compared with {previous['commit']} ({previous['date']})")
+
+    regressions = 0
+    for metric, higher_is_better in METRICS.items():
+        line = f"{metric:>24}: {results[metric]:>12,}"
+        if previous is not None and previous["results"].get(metric):
+            change = (results[metric] - previous["results"][metric]) / previous["results"][metric] * 100
+            worse = -change if higher_is_better else change
+            line += f" ({change:+.1f}%)"
+            if args.max_regression is not None and worse > args.max_regression:
+                line += " REGRESSION"
+                regressions += 1
+        print(line)
+
+    if args.record:
+        record = {
+            "commit": git_commit(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "settings": settings,
+            "results": results
+        }
+        with open(args.record, "a") as record_file:
+            record_file.write(json.dumps(record) + "\n")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parsing and processing a synthetic ESEA match")
+
+    parser.add_argument("--rounds", type=int, default=30, help="The amount of rounds in regulation time (16 to 30)")
+
+    parser.add_argument("--overtimes", type=int, default=0, help="The amount of overtimes")
+
+    parser.add_argument("--players", type=int, default=10, help="The amount of players")
+
+    parser.add_argument("--events-per-round", type=int, default=400,
+                        help="The amount of player events in each round besides kills, the bomb and the round flow")
+
+    parser.add_argument("--seed", type=int, default=0, help="The random seed for the synthetic match")
+
+    parser.add_argument("--retain", choices=("all", "aggregates"), default="all", help="What Demo keeps per round")
+
+    parser.add_argument("--repeat", type=int, default=3, help="The amount of timed runs")
+
+    parser.add_argument("--record", metavar="PATH",
+                        help="Append the results to this JSON lines file, after comparing them with the last run "
+                             "recorded there with the same settings")
+
+    parser.add_argument("--max-regression", type=float, metavar="PERCENT",
+                        help="Exit with 1 if any metric got worse than the recorded run by more than this")
+
+    sys.exit(main(parser.parse_args()))
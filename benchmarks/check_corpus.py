@@ -0,0 +1,48 @@
+"""
+Parser regression corpus check
+
+Parses every benchmarks/corpus/*.txt file and compares the events to the matching .json file.
+Run from the repository root with `python -m benchmarks.check_corpus`, or with --update to rewrite the .json files
+after an intended change to the parser's output.
+"""
+import argparse
+import json
+from pathlib import Path
+import sys
+
+import OpenScore._Parser as Parser
+
+CORPUS_DIR = Path(__file__).parent / Path("corpus")
+
+
+def main(args) -> int:
+    failures = 0
+    for corpus_path in sorted(CORPUS_DIR.glob("*.txt")):
+        expected_path = corpus_path.with_suffix(".json")
+        events = list(Parser.parse(corpus_path))
+
+        if args.update:
+            with open(expected_path, "w") as expected_file:
+                json.dump(events, expected_file, indent=1)
+                expected_file.write("\n")
+            print(f"Updated {expected_path.name}")
+            continue
+
+        with open(expected_path) as expected_file:
+            expected = json.load(expected_file)
+        # Round-trip through JSON so that both sides have the same types
+        if json.loads(json.dumps(events)) == expected:
+            print(f"OK   {corpus_path.name}")
+        else:
+            print(f"FAIL {corpus_path.name}")
+            failures += 1
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the parser against the regression corpus")
+
+    parser.add_argument("--update", action="store_true", help="Rewrite the expected output from the current parser")
+
+    sys.exit(main(parser.parse_args()))
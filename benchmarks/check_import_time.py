@@ -0,0 +1,78 @@
+"""
+Startup budget check
+
+Measures `import OpenScore` with `python -X importtime` in fresh interpreters and fails if it takes longer than the
+budget, or if it imports any of the modules which are only needed by some commands (PyYAML, NumPy, asyncio, ...).
+Run from the repository root with `python -m benchmarks.check_import_time`
+"""
+import argparse
+from pathlib import Path
+import subprocess
+import sys
+
+# Only imported once a feature which needs them is used
+LAZY_MODULES = ("yaml", "numpy", "asyncio", "concurrent.futures", "subprocess", "cProfile")
+
+REPOSITORY_DIR = Path(__file__).parent.parent
+
+DEFAULT_BUDGET_MS = 120.0
+
+
+def compile_package():
+    """
+    Compile OpenScore up front so that the first measured import doesn't also pay for writing bytecode
+    """
+    subprocess.run([sys.executable, "-m", "compileall", "-q", "OpenScore"], cwd=REPOSITORY_DIR, check=True)
+
+
+def import_time_ms() -> float:
+    """
+    :return: The cumulative import time of OpenScore in a fresh interpreter
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import OpenScore"], cwd=REPOSITORY_DIR,
+                            capture_output=True, text=True, check=True)
+    # Lines look like "import time: <self us> | <cumulative us> | <module>", indented by nesting depth
+    for line in result.stderr.splitlines():
+        _, cumulative_us, name = line.split("|")
+        if name.strip() == "OpenScore":
+            return int(cumulative_us) / 1000
+    raise RuntimeError(f"OpenScore missing from the import times:\n{result.stderr}")
+
+
+def imported_lazy_modules() -> list:
+    code = f"import sys, OpenScore; print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPOSITORY_DIR, capture_output=True, text=True,
+                            check=True)
+    return result.stdout.split()
+
+
+def main(args) -> int:
+    compile_package()
+
+    best = min(import_time_ms() for _ in range(args.repeat))
+    failures = 0
+    if best <= args.budget_ms:
+        print(f"OK   import OpenScore: {best:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    else:
+        print(f"FAIL import OpenScore: {best:.1f} ms (budget {args.budget_ms:.0f} ms)")
+        failures += 1
+
+    eager = imported_lazy_modules()
+    if eager:
+        print(f"FAIL imported at startup: {', '.join(eager)}")
+        failures += 1
+    else:
+        print(f"OK   not imported at startup: {', '.join(LAZY_MODULES)}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check how long importing OpenScore takes")
+
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="The most milliseconds the import may take")
+
+    parser.add_argument("--repeat", type=int, default=5, help="The amount of runs; the fastest one is checked")
+
+    sys.exit(main(parser.parse_args()))
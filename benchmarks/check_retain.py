@@ -0,0 +1,79 @@
+"""
+Retain mode check
+
+Processes synthetic ESEA matches with retain="all", with count_rounds and with retain="aggregates", and fails if their
+scoreboards differ, for several trade windows, halfway through the match (a live demo with an open round) and once it
+is finished.
+Run from the repository root with `python -m benchmarks.check_retain`
+"""
+import argparse
+import sys
+
+import numpy as np
+
+import OpenScore
+from benchmarks import synthetic
+
+# The Demo options to compare, the first of which counts every round from its raw records
+OPTIONS = ({"retain": "all"}, {"retain": "all", "count_rounds": True}, {"retain": "aggregates"})
+
+# (rounds, overtimes) of the matches to check
+MATCHES = ((16, 0), (30, 0), (30, 2))
+
+TRADE_WINDOWS = (5.0, 1.0, 0.0)
+
+
+def tables_equal(first, second) -> bool:
+    """
+    :return: Whether two dicts of column name -> NumPy array (or nested dicts of them) have the same columns and values
+    """
+    if isinstance(first, dict):
+        return isinstance(second, dict) and first.keys() == second.keys() and all(
+            tables_equal(first[name], second[name]) for name in first)
+    return first.dtype == second.dtype and np.array_equal(first, second)
+
+
+def scoreboards_equal(demos, trade_window: float) -> bool:
+    expected, *others = (demo.scoreboard(trade_window) for demo in demos)
+    return all(tables_equal(getattr(expected, table), getattr(other, table))
+               for other in others for table in ("players", "player_rounds", "rounds", "matches"))
+
+
+def main(args) -> int:
+    failures = 0
+    for rounds, overtimes in MATCHES:
+        for seed in range(args.seeds):
+            lines = list(synthetic.generate_match(rounds, overtimes=overtimes, events_per_round=args.events_per_round,
+                                                  seed=seed))
+            demos = [OpenScore.Demo.live("esea", None, **options) for options in OPTIONS]
+
+            half = len(lines) // 2
+            for demo in demos:
+                demo.feed(lines[:half])
+            ok = scoreboards_equal(demos, TRADE_WINDOWS[0])
+
+            for demo in demos:
+                demo.feed(lines[half:])
+                demo.finish()
+            ok = ok and all(scoreboards_equal(demos, trade_window) for trade_window in TRADE_WINDOWS)
+
+            name = f"{rounds} rounds, {overtimes} overtimes, seed {seed}"
+            if ok:
+                print(f"OK   {name}")
+            else:
+                print(f"FAIL {name}")
+                failures += 1
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that counting rounds as they end gives the same scoreboard as "
+                                                 "counting every raw record")
+
+    parser.add_argument("--seeds", type=int, default=2, help="The amount of random seeds per match length")
+
+    parser.add_argument("--events-per-round", type=int, default=200,
+                        help="The amount of player events in each round besides kills, the bomb and the round flow")
+
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,350 @@
+"""
+Synthetic demoinfogo "-gameevents -extrainfo" output for benchmarking
+"""
+import random
+from typing import Dict, Iterator, List
+
+_WEAPONS = ("weapon_ak47", "weapon_m4a1", "weapon_awp", "weapon_deagle", "weapon_usp_silencer", "weapon_glock")
+
+
+def _user_lines(key: str, name: str, steamid64: str, player_id: int, rng: random.Random) -> Iterator[str]:
+    yield f" {key}: {name} {steamid64} (id:{player_id})"
+    yield f"  position: {rng.uniform(-2500, 2500):.6f}, {rng.uniform(-2500, 2500):.6f}, {rng.uniform(-200, 200):.6f}"
+    yield f"  facing: pitch:{rng.uniform(-89, 89):.6f}, yaw:{rng.uniform(-180, 180):.6f}"
+    yield f"  team: {rng.choice(('T', 'CT'))}"
+
+
+def generate(events: int = 100000, players: int = 10, seed: int = 0) -> Iterator[str]:
+    """
+    Generate a stream of player events in the demoinfogo output format
+    :param events: The amount of events to generate
+    :param players: The amount of players in the match
+    :param seed: The random seed, so that runs are reproducible
+    :yield: The next line of output
+    """
+    rng = random.Random(seed)
+    roster = [(f"Player {i}", str(76561198000000000 + i), i + 2) for i in range(players)]
+    tick = 0
+    for _ in range(events):
+        tick += rng.randint(1, 16)
+        player = rng.choice(roster)
+        roll = rng.random()
+        if roll < 0.35:
+            yield "player_footstep"
+            yield "{"
+            yield from _user_lines("userid", *player, rng)
+        elif roll < 0.55:
+            yield "weapon_zoom"
+            yield "{"
+            yield from _user_lines("userid", *player, rng)
+        elif roll < 0.85:
+            yield "weapon_fire"
+            yield "{"
+            yield from _user_lines("userid", *player, rng)
+            yield f" weapon: {rng.choice(_WEAPONS)}"
+            yield " silenced: 0"
+        else:
+            attacker = rng.choice(roster)
+            yield "player_hurt"
+            yield "{"
+            yield from _user_lines("userid", *player, rng)
+            yield from _user_lines("attacker", *attacker, rng)
+            yield f" health: {rng.randint(0, 99)}"
+            yield f" armor: {rng.randint(0, 100)}"
+            yield f" weapon: {rng.choice(_WEAPONS)[7:]}"
+            yield f" dmg_health: {rng.randint(1, 100)}"
+            yield f" dmg_armor: {rng.randint(0, 20)}"
+            yield f" hitgroup: {rng.randint(1, 7)}"
+        yield f" tick: {tick}"
+        yield "}"
+
+
+TICK_RATE = 128
+
+# Relative weights of the events players produce between the scripted ones (round flow, the bomb and kills)
+DEFAULT_EVENT_MIX = {
+    "player_footstep": 40,
+    "weapon_fire": 24,
+    "item_equip": 10,
+    "player_hurt": 8,
+    "weapon_zoom": 6,
+    "weapon_reload": 5,
+    "player_jump": 5,
+    "player_blind": 2
+}
+
+_FREEZE_TICKS = 15 * TICK_RATE
+_ROUND_TICKS = 115 * TICK_RATE
+_BOMB_TICKS = 40 * TICK_RATE
+_DEFUSE_TICKS = 10 * TICK_RATE
+
+
+def _round_winners(rounds: int, overtimes: int, rng: random.Random) -> List[int]:
+    """
+    :return: 0 or 1 (the team which starts as T, or the other one) for each round, ending the match on the last one
+    """
+    if overtimes:
+        # 15-15, then a 3-3 draw for each but the last overtime, which team 0 wins 4-x
+        winners = _shuffled(15, 15, rng)
+        for _ in range(overtimes - 1):
+            winners += _shuffled(3, 3, rng)
+        return winners + _shuffled(3, rng.randint(0, 2), rng) + [0]
+    # Team 0 takes its 16th round on the last one
+    return _shuffled(15, rounds - 16, rng) + [0]
+
+
+def _shuffled(team_0_wins: int, team_1_wins: int, rng: random.Random) -> List[int]:
+    winners = [0] * team_0_wins + [1] * team_1_wins
+    rng.shuffle(winners)
+    return winners
+
+
+class _MatchWriter:
+    """
+    Writes the events of one ESEA match. Sides only switch at half time, which is when Demo swaps the score
+    """
+    def __init__(self, players: int, events_per_round: int, event_mix: Dict[str, float], rng: random.Random):
+        self.rng = rng
+        self.events_per_round = events_per_round
+        self.event_types = list(event_mix)
+        self.event_weights = [event_mix[event_type] for event_type in self.event_types]
+        self.roster = [(f"Player {i}", str(76561198000000000 + i), i + 2) for i in range(players)]
+        self.teams = (self.roster[:players // 2], self.roster[players // 2:])
+        self.positions = {player: [rng.uniform(-2500, 2500), rng.uniform(-2500, 2500), rng.uniform(-200, 200)]
+                          for player in self.roster}
+        self.tick = rng.randint(1000, 5000)
+        self.sides = {}
+        self.health = {}
+
+    def event(self, event_type: str, *body: Iterator[str]) -> Iterator[str]:
+        yield event_type
+        yield "{"
+        for lines in body:
+            yield from lines
+        yield f" tick: {self.tick}"
+        yield "}"
+
+    def user(self, key: str, player: tuple) -> Iterator[str]:
+        name, steamid64, player_id = player
+        position = self.positions[player]
+        # Players wander around the map instead of teleporting between events
+        position[0] += self.rng.uniform(-40, 40)
+        position[1] += self.rng.uniform(-40, 40)
+        yield f" {key}: {name} {steamid64} (id:{player_id})"
+        yield f"  position: {position[0]:.6f}, {position[1]:.6f}, {position[2]:.6f}"
+        yield f"  facing: pitch:{self.rng.uniform(-30, 30):.6f}, yaw:{self.rng.uniform(-180, 180):.6f}"
+        yield f"  team: {self.sides[player]}"
+
+    def values(self, **values) -> Iterator[str]:
+        for key, value in values.items():
+            yield f" {key}: {value}"
+
+    def restarts(self, first_half: bool) -> Iterator[str]:
+        """
+        The 3 restarts and the live restart ESEA servers do before each half. Demo starts the half's first round on
+        the 4th begin_new_match
+        """
+        self.set_sides(first_half)
+        for restart in range(4):
+            self.tick += self.rng.randint(1, 3) * TICK_RATE
+            yield from self.event("round_prestart")
+            yield from self.event("begin_new_match")
+
+    def set_sides(self, first_half: bool):
+        t_team, ct_team = self.teams if first_half else self.teams[::-1]
+        self.sides = {**{player: "T" for player in t_team}, **{player: "CT" for player in ct_team}}
+
+    def warmup(self) -> Iterator[str]:
+        self.set_sides(True)
+        self.health = dict.fromkeys(self.roster, 100)
+        for _ in range(self.events_per_round // 4):
+            yield from self.filler(self.roster, self.roster)
+
+    def round(self, winning_team: int, first_half: bool, after_restarts: bool) -> Iterator[str]:
+        rng = self.rng
+        t_team, ct_team = self.teams if first_half else self.teams[::-1]
+        winner_side = "T" if (winning_team == 0) == first_half else "CT"
+        alive = set(self.roster)
+        self.health = dict.fromkeys(self.roster, 100)
+
+        if not after_restarts:
+            self.tick += rng.randint(5, 7) * TICK_RATE
+            yield from self.event("round_prestart")
+        yield from self.event("round_start", self.values(timelimit=115, fraglimit=0, objective="BOMB TARGET"))
+        yield from self.event("round_poststart")
+        carrier = rng.choice(t_team)
+        yield from self.event("bomb_pickup", self.user("userid", carrier))
+        self.tick += _FREEZE_TICKS
+        yield from self.event("round_freeze_end")
+
+        # How the round is won decides who dies and what happens to the bomb
+        if winner_side == "T":
+            reason = rng.choice((1, 9))
+        else:
+            reason = rng.choice((7, 8, 12))
+        planted = reason in (1, 7) or (reason == 9 and rng.random() < 0.3)
+        loser_team = ct_team if winner_side == "T" else t_team
+        winner_team = t_team if winner_side == "T" else ct_team
+        deaths = rng.sample(winner_team, rng.randint(0, len(winner_team) - 1))
+        if reason in (8, 9):
+            deaths += loser_team
+        else:
+            deaths += rng.sample(loser_team, rng.randint(0, len(loser_team) - 1))
+        rng.shuffle(deaths)
+
+        duration = rng.randint(_ROUND_TICKS // 3, _ROUND_TICKS)
+        scripted = [(rng.uniform(0.05, 0.95), "death", victim) for victim in deaths]
+        if planted:
+            plant_time = rng.uniform(0.3, 0.7)
+            scripted.append((plant_time, "plant", None))
+            if reason == 7:
+                scripted.append((rng.uniform(plant_time, 1), "defuse", None))
+        elif reason == 12:
+            duration = _ROUND_TICKS
+        if rng.random() < 0.3:
+            # Some carriers drop the bomb, and the T who picks it up again carries it from then on
+            scripted.append((rng.uniform(0, 0.3), "drop", None))
+        scripted.sort(key=lambda action: action[0])
+
+        events = self.events_per_round
+        step = max(1, duration // (events + 1))
+        next_action = 0
+        for index in range(events + 1):
+            while next_action < len(scripted) and scripted[next_action][0] * events <= index:
+                _, action, victim = scripted[next_action]
+                next_action += 1
+                if action == "death":
+                    yield from self.kill(victim, alive)
+                elif action == "plant":
+                    carrier = carrier if carrier in alive else next(p for p in t_team if p in alive)
+                    yield from self.event("bomb_planted", self.user("userid", carrier), self.values(site=rng.choice((
+                        144, 145))))
+                elif action == "defuse":
+                    defuser = next(p for p in ct_team if p in alive)
+                    haskit = rng.random() < 0.6
+                    yield from self.event("bomb_begindefuse", self.user("userid", defuser),
+                                          self.values(haskit=int(haskit)))
+                    self.tick += (5 if haskit else 10) * TICK_RATE
+                    yield from self.event("bomb_defused", self.user("userid", defuser),
+                                          self.values(site=rng.choice((144, 145))))
+                elif action == "drop" and carrier in alive:
+                    yield from self.event("bomb_dropped", self.user("userid", carrier),
+                                          self.values(entindex=rng.randint(100, 400)))
+                    self.tick += rng.randint(1, 4) * TICK_RATE
+                    carrier = rng.choice([p for p in t_team if p in alive])
+                    yield from self.event("bomb_pickup", self.user("userid", carrier))
+            if index < events:
+                self.tick += rng.randint(1, 2 * step - 1) if step > 1 else 1
+                yield from self.filler([p for p in t_team if p in alive], [p for p in ct_team if p in alive])
+            if rng.random() < 0.002:
+                # A spectator coming and going, which demoinfogo reports between the events
+                yield f"Spectator {rng.randint(1, 9)} disconnected"
+
+        if reason == 1:
+            self.tick += _BOMB_TICKS
+            yield from self.event("bomb_exploded", self.user("userid", carrier), self.values(site=144))
+        winner = 2 if winner_side == "T" else 3
+        message = {1: "#SFUI_Notice_Target_Bombed", 7: "#SFUI_Notice_Bomb_Defused", 8: "#SFUI_Notice_CTs_Win",
+                   9: "#SFUI_Notice_Terrorists_Win", 12: "#SFUI_Notice_Target_Saved"}[reason]
+        self.tick += 1
+        yield from self.event("round_end", self.values(winner=winner, reason=reason, message=message))
+        self.tick += 7 * TICK_RATE
+        yield from self.event("round_officially_ended")
+
+    def kill(self, victim: tuple, alive: set) -> Iterator[str]:
+        rng = self.rng
+        enemies = [p for p in self.roster if p in alive and self.sides[p] != self.sides[victim]]
+        if victim not in alive or not enemies:
+            return
+        attacker = rng.choice(enemies)
+        weapon = rng.choice(_WEAPONS)[7:]
+        headshot = rng.random() < 0.45
+        # The damage leading up to the kill, with the killing hit taking whatever health is left
+        while self.health[victim] > 0:
+            damage = self.health[victim] if rng.random() < 0.6 else rng.randint(1, self.health[victim])
+            yield from self.hurt(victim, attacker, weapon, damage, 1 if headshot else rng.randint(2, 7))
+        alive.discard(victim)
+
+        teammates = [p for p in self.roster if p in alive and p != attacker and self.sides[p] == self.sides[attacker]]
+        if teammates and rng.random() < 0.35:
+            assister = self.user("assister", rng.choice(teammates))
+        else:
+            assister = iter(("Cannot find player 0", " assister: 0"))
+        yield from self.event("player_death", self.user("userid", victim), self.user("attacker", attacker), assister,
+                              self.values(assistedflash=0, weapon=weapon, weapon_itemid=0,
+                                          weapon_fauxitemid=rng.randint(10**17, 10**18),
+                                          weapon_originalowner_xuid=attacker[1], headshot=int(headshot),
+                                          dominated=0, revenge=0, penetrated=int(rng.random() < 0.05), noreplay=0))
+
+    def hurt(self, victim: tuple, attacker: tuple, weapon: str, damage: int, hitgroup: int) -> Iterator[str]:
+        self.health[victim] -= damage
+        self.tick += self.rng.randint(1, 8)
+        yield from self.event("player_hurt", self.user("userid", victim), self.user("attacker", attacker),
+                              self.values(health=self.health[victim], armor=self.rng.randint(0, 100), weapon=weapon,
+                                          dmg_health=damage, dmg_armor=self.rng.randint(0, 20), hitgroup=hitgroup))
+
+    def filler(self, t_alive: list, ct_alive: list) -> Iterator[str]:
+        rng = self.rng
+        players = t_alive + ct_alive
+        event_type = rng.choices(self.event_types, self.event_weights)[0]
+        player = rng.choice(players)
+        enemies = ct_alive if self.sides[player] == "T" else t_alive
+        if event_type in ("player_hurt", "player_blind") and not enemies:
+            event_type = "player_footstep"
+
+        if event_type == "weapon_fire":
+            weapon = rng.choice(_WEAPONS)
+            yield from self.event(event_type, self.user("userid", player),
+                                  self.values(weapon=weapon, silenced=int(weapon == "weapon_usp_silencer")))
+        elif event_type == "item_equip":
+            weapon = rng.choice(_WEAPONS)
+            yield from self.event(event_type, self.user("userid", player), self.values(
+                item=weapon[7:], canzoom=int(weapon == "weapon_awp"), hassilencer=int(weapon == "weapon_usp_silencer"),
+                issilenced=int(weapon == "weapon_usp_silencer"), hastracers=1, weptype=rng.randint(1, 5),
+                ispainted=rng.randint(0, 1)))
+        elif event_type == "player_hurt":
+            attacker = rng.choice(enemies)
+            if self.health[player] > 1:
+                yield from self.hurt(player, attacker, rng.choice(_WEAPONS)[7:],
+                                     rng.randint(1, min(self.health[player] - 1, 40)), rng.randint(1, 7))
+            else:
+                yield from self.event("player_footstep", self.user("userid", player))
+        elif event_type == "player_blind":
+            yield from self.event(event_type, self.user("userid", player), self.user("attacker", rng.choice(enemies)),
+                                  self.values(entityid=rng.randint(100, 400),
+                                              blind_duration=f"{rng.uniform(0.1, 4.5):.6f}"))
+        else:
+            yield from self.event(event_type, self.user("userid", player))
+
+
+def generate_match(rounds: int = 30, players: int = 10, events_per_round: int = 400, overtimes: int = 0,
+                   event_mix: Dict[str, float] = None, seed: int = 0) -> Iterator[str]:
+    """
+    Generate the demoinfogo output of a whole ESEA match: warmup, the restarts before each half, and rounds with
+    bomb plants, defuses and kills which end the way their round_end events say. The first team wins 16-(rounds-16),
+    or after the given amount of MR3 overtimes
+    :param rounds: The amount of rounds in regulation time, from 16 to 30 (ignored with overtimes, which need 30)
+    :param players: The amount of players, split between the two teams
+    :param events_per_round: The amount of events players produce in each round besides the scripted ones
+    :param overtimes: The amount of overtimes, the last of which decides the match
+    :param event_mix: The relative weights of the event types players produce (DEFAULT_EVENT_MIX by default)
+    :param seed: The random seed, so that runs are reproducible
+    :yield: The next line of output
+    """
+    if not overtimes and not 16 <= rounds <= 30:
+        raise ValueError(f"A match without overtime has 16 to 30 rounds, not {rounds}")
+    if players < 2:
+        raise ValueError("A match needs at least 2 players")
+
+    rng = random.Random(seed)
+    writer = _MatchWriter(players, events_per_round, event_mix or DEFAULT_EVENT_MIX, rng)
+    winners = _round_winners(rounds, overtimes, rng)
+
+    yield from writer.warmup()
+    yield from writer.restarts(first_half=True)
+    for round_index, winning_team in enumerate(winners):
+        # Demo's round 16 starts with the second half's restarts
+        after_restarts = round_index in (0, 15)
+        if round_index == 15:
+            yield from writer.restarts(first_half=False)
+        yield from writer.round(winning_team, round_index < 15, after_restarts)
@@ -1,31 +1,133 @@
 import argparse
+import json
 import logging
+from pathlib import Path
 
 import OpenScore
 
 
+def write_profile(profile: str, dest: str):
+    if dest == "-":
+        print(profile)
+    else:
+        with open(dest, "w") as profile_file:
+            profile_file.write(profile)
+
+
 def main(args):
-    d = OpenScore.Demo(args.demo, args.type, args.config, args.skip_processing)
+    config_path = None if args.env_config else args.config
+    demo_kwargs = {
+        "use_cache": args.cache,
+        "rebuild_cache": args.rebuild_cache,
+        "parse_all_events": args.parse_all_events,
+        "profile": args.profile is not None,
+        "cprofile_path": args.cprofile,
+        "retain": args.retain,
+        "index_events": args.index_events
+    }
+    if args.parse_workers is not None:
+        demo_kwargs["parse_workers"] = args.parse_workers
+
+    if args.batch:
+        demo_stats = {}
+
+        def on_result(result):
+            # Runs as each demo finishes, so that its Demo can be dropped instead of kept until the batch is done
+            print(f"{result.demo_path}: {'ok' if result.ok else 'FAILED'} ({result.wall_time:.2f}s)")
+            if result.ok:
+                if args.export:
+                    OpenScore.export_columns(result.demo.gamestate, Path(args.export) / Path(result.demo_path).stem)
+                if args.profile is not None:
+                    demo_stats[str(result.demo_path)] = result.demo.stats.to_dict()
+
+        report = OpenScore.process_many(sorted(Path(args.batch).glob("*.dem")), args.type, config_path,
+                                        workers=args.workers, tee_output=args.tee_output, on_result=on_result,
+                                        keep_demos=False, **demo_kwargs)
+        print(f"{len(report.results)} demos in {report.wall_time:.2f}s ({report.demos_per_minute:.1f} demos/min)")
+
+        if args.profile is not None:
+            write_profile(json.dumps({
+                "wall_time": report.wall_time,
+                "demos_per_minute": report.demos_per_minute,
+                "demos": demo_stats
+            }, indent=1), args.profile)
+        return
+
+    d = OpenScore.Demo(args.demo, args.type, config_path, args.skip_processing, args.tee_output, **demo_kwargs)
     gamestate = d.gamestate  # Parsed match data is here
-    pass
+
+    if args.export:
+        OpenScore.export_columns(gamestate, args.export)
+
+    if args.profile is not None:
+        write_profile(d.stats.to_json(indent=1), args.profile)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate statistics for CS:GO demos")
 
-    parser.add_argument("demo", help="The CS:GO .dem file to process")
+    parser.add_argument("demo", nargs="?", help="The CS:GO .dem file to process")
+
+    parser.add_argument("--batch", metavar="DIR", help="Process every .dem file in DIR in parallel")
+
+    parser.add_argument("--workers", type=int, help="The amount of worker processes for --batch (default: CPU count)")
 
-    parser.add_argument("--config", default="config.yml", help="The path to the config YAML file")
+    parser.add_argument("--config", default="config.yml",
+                        help="The path to the config YAML or JSON file (JSON loads faster). "
+                             "OPENSCORE_<KEY> environment variables override its values")
+
+    parser.add_argument("--env-config", action="store_true",
+                        help="Read the config from OPENSCORE_<KEY> environment variables only, ignoring --config")
 
     parser.add_argument("--type", default="valve", choices=["valve", "esea"],
                         help="Signals the matchmaking service that this demo is from")
 
     parser.add_argument("--skip-processing", action="store_true", help="Skip demoinfogo processing")
 
+    parser.add_argument("--parse-workers", type=int, metavar="N",
+                        help="With --skip-processing, parse the output file in N worker processes")
+
+    parser.add_argument("--tee-output", action="store_true",
+                        help="Also write demoinfogo output to the tmp directory while parsing it (for debugging)")
+
+    parser.add_argument("--cache", action="store_true",
+                        help="Load the demo from the parsed demo cache if it has been processed before, and store it "
+                             "there otherwise")
+
+    parser.add_argument("--rebuild-cache", action="store_true",
+                        help="Re-process the demo and overwrite its entry in the parsed demo cache (implies --cache)")
+
+    parser.add_argument("--parse-all-events", action="store_true",
+                        help="Parse every event, not just the ones used for statistics (records more positions)")
+
+    parser.add_argument("--index-events", action="store_true",
+                        help="Index every live event by tick for event lookups (doubles the memory held and the "
+                             "parsed demo cache entries)")
+
+    parser.add_argument("--retain", default="all", choices=["all", "aggregates"],
+                        help="Keep every raw record, or only each round's statistics once it is over (bounded memory)")
+
+    parser.add_argument("--export", metavar="DIR",
+                        help="Write shots, hits, deaths, positions and bomb events as columnar files to DIR "
+                             "(one subdirectory per demo with --batch)")
+
+    parser.add_argument("--profile", nargs="?", const="-", metavar="PATH",
+                        help="Write stage timings, throughput, event counts and peak memory as JSON to PATH "
+                             "(default: stdout)")
+
+    parser.add_argument("--cprofile", metavar="PATH",
+                        help="Profile the event loop with cProfile and dump the stats to PATH "
+                             "(with --batch, one file per demo named after PATH, e.g. batch-<demo>.prof)")
+
     parser.add_argument("--log", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
                         help="Set the log level")
 
     parsed_args = parser.parse_args()
+    if parsed_args.demo is None and parsed_args.batch is None:
+        parser.error("either a demo or --batch DIR is required")
+    if parsed_args.export and parsed_args.retain == "aggregates":
+        # The exported tables are built from the raw records, which --retain aggregates releases
+        parser.error("--export needs --retain all")
 
     # Set the log level
     logging.basicConfig(level=getattr(logging, parsed_args.log))
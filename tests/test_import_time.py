@@ -0,0 +1,18 @@
+"""
+The startup budget of benchmarks/check_import_time.py, enforced as a test
+"""
+from benchmarks.check_import_time import DEFAULT_BUDGET_MS, LAZY_MODULES, compile_package, import_time_ms, \
+    imported_lazy_modules
+
+
+def setup_module():
+    compile_package()
+
+
+def test_import_time_within_budget():
+    best = min(import_time_ms() for _ in range(5))
+    assert best <= DEFAULT_BUDGET_MS, f"import OpenScore took {best:.1f} ms (budget {DEFAULT_BUDGET_MS:.0f} ms)"
+
+
+def test_lazy_modules_not_imported_at_startup():
+    assert imported_lazy_modules() == [], f"these should only be imported when used: {', '.join(LAZY_MODULES)}"